@@ -35,17 +35,16 @@ class PickupAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
-                if len(inventory.items) >= inventory.capacity:
-                    raise exceptions.Impossible("Your inventory is full.")
+        for item in self.engine.game_map.get_items_at_location(actor_location_x, actor_location_y):
+            if len(inventory.items) >= inventory.capacity:
+                raise exceptions.Impossible("Your inventory is full.")
 
-                self.engine.game_map.entities.remove(item)
-                item.parent = self.entity.inventory
-                inventory.items.append(item)
+            self.engine.game_map.remove_entity(item)
+            item.parent = self.entity.inventory
+            inventory.items.append(item)
 
-                self.engine.message_log.add_message(f"You picked up the {item.name}!")
-                return
+            self.engine.message_log.add_message(f"You picked up the {item.name}!")
+            return
 
         raise exceptions.Impossible("There is nothing here to pick up.")
 
@@ -152,6 +151,7 @@ class MovementAction(ActionWithDirection):
             if blocking_entity.name == "Door":
                 blocking_entity.blocks_movement = False
                 blocking_entity.char = ""
+                self.engine.game_map.set_transparent(dest_x, dest_y, True)
             # Destination is blocked by an entity.
             raise exceptions.Impossible("That way is blocked by someething..")
         self.entity.move(self.dx, self.dy)
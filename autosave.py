@@ -0,0 +1,55 @@
+"""Saving the game every so often while it is played."""
+from __future__ import annotations
+import time
+from concurrent.futures import Future
+from typing import Optional, TYPE_CHECKING
+import color
+import debug_log
+import savefile
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+logger = debug_log.get_logger(debug_log.SAVE)
+
+
+class Autosaver:
+    """
+    Saves the game to its save slot once every `interval` seconds.
+
+    Only a snapshot is taken on the main thread, which pickles just the entities
+    that changed since the last save. It is compressed and written on the save
+    thread, so the game does not stall while it is saved.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_save = time.monotonic()
+        self._future: Optional[Future] = None
+
+    def update(self, engine: Engine) -> None:
+        """Save `engine` if it has been long enough since the last save."""
+        self._report_failure(engine)
+        if engine.save_filename is None or time.monotonic() - self.last_save < self.interval:
+            return
+        if self._future is not None and not self._future.done():
+            return  # The last autosave is still being written, so try again next time.
+        start = time.perf_counter()
+        engine.message_log.flush_spill()
+        self._future = savefile.save_in_background(engine, engine.save_filename)
+        self.last_save = time.monotonic()
+        # This is how long the game stalled for, so it should stay well under a frame.
+        logger.info(
+            "Autosaving to %s, snapshot took %.1f ms", engine.save_filename, (time.perf_counter() - start) * 1000
+        )
+
+    def _report_failure(self, engine: Engine) -> None:
+        """Tell the player if the last autosave could not be written, so they do not rely on it."""
+        if self._future is None or not self._future.done():
+            return
+        exc = self._future.exception()
+        self._future = None
+        if exc is not None:
+            # It is logged on the save thread too, which always reaches stderr.
+            engine.message_log.add_message(f"Autosave failed: {exc}", color.error)
+            engine.needs_render = True
@@ -1,15 +1,18 @@
 from __future__ import annotations
 import pdb
-import random
+import rng
+import debug_log
 from typing import Callable, Optional, Tuple, TYPE_CHECKING, List
 from enum import auto, Enum
-import numpy as np  # type: ignore
-import tcod
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction, AttackAction
+from components.path_follower import PathFollower
+from pathfinding import compute_path
 
 if TYPE_CHECKING:
     from entity import Actor, Entity
 
+logger = debug_log.get_logger(debug_log.AI)
+
 class NPCActivity(Enum):
     WANDER = auto()
     GO_HOME = auto()
@@ -28,28 +31,10 @@ class BaseAI(Action):
 
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
-            # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
-
-        # Create a graph from the cost array and pass that graph to a new pathfinder.
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
-
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
-
-        # Compute the path to the destination and remove the starting point.
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
-        # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        return compute_path(
+            self.entity.gamemap, (self.entity.x, self.entity.y), (dest_x, dest_y)
+        )
+
 class WanderingAI(BaseAI):
     """A wandering enemy will rander aimlessly until their AI type changes"""
     def __init__(
@@ -58,7 +43,7 @@ class WanderingAI(BaseAI):
         super().__init__(entity)
 
     def perform(self) -> None:
-        direction_x, direction_y = random.choice(
+        direction_x, direction_y = self.engine.rng.stream(rng.AI).choice(
             [
                 (-1, -1),  # Northwest
                 (0, -1),  # North
@@ -92,7 +77,7 @@ class ConfusedEnemy(BaseAI):
             self.entity.ai = self.previous_ai
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice(
+            direction_x, direction_y = self.engine.rng.stream(rng.AI).choice(
                 [
                     (-1, -1),  # Northwest
                     (0, -1),  # North
@@ -114,7 +99,8 @@ class ConfusedEnemy(BaseAI):
 class HostileEnemy(BaseAI):
     def __init__(self, entity: Actor, previous_ai: Optional[BaseAI] = None):
         super().__init__(entity)
-        self.path: List[Tuple[int, int]] = []
+        # Where the player was last seen. Chased even after they leave view.
+        self.target_location: Optional[Tuple[int, int]] = None
 
     def perform(self) -> None:
         target = self.engine.player
@@ -122,24 +108,30 @@ class HostileEnemy(BaseAI):
         dy = target.y - self.entity.y
         distance = max(abs(dx), abs(dy))  # Chebyshev distance.
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
-            if distance <= 1:
+        if self.engine.perception.can_see(self.entity, target.x, target.y):
+            # Only attack next door, never the actor's own tile.
+            if distance == 1:
                 return MeleeAction(self.entity, dx, dy, False).perform()
 
-            self.path = self.get_path_to(target.x, target.y)
+            self.target_location = target.x, target.y
 
-        if self.path:
-            dest_x, dest_y = self.path.pop(0)
-            return MovementAction(
-                self.entity, dest_x - self.entity.x, dest_y - self.entity.y, False
-            ).perform()
+        if self.target_location:
+            if self.target_location == (self.entity.x, self.entity.y):
+                self.target_location = None
+            else:
+                # Every enemy chasing the player shares one distance map this turn.
+                step = self.engine.distance_maps.next_step(self.entity, *self.target_location)
+                if step:
+                    dest_x, dest_y = step
+                    return MovementAction(
+                        self.entity, dest_x - self.entity.x, dest_y - self.entity.y, False
+                    ).perform()
 
         return WaitAction(self.entity).perform()
 
 class Combatant(BaseAI):
     def __init__(self, entity: Actor, target: Actor, previous_ai: Optional[BaseAI] = None):
         super().__init__(entity, previous_ai)
-        self.path: List[Tuple[int, int]] = []
         self.target = target
 
     def perform(self) -> None:
@@ -147,13 +139,15 @@ class Combatant(BaseAI):
             dx = self.target.x - self.entity.x
             dy = self.target.y - self.entity.y
             distance = max(abs(dx), abs(dy))  # Chebyshev distance.
-            if distance <= 1:
+            # Only attack next door, never the actor's own tile.
+            if distance == 1:
                 return MeleeAction(self.entity, dx, dy, False).perform()
 
-            self.path = self.get_path_to(self.target.x, self.target.y)
+            # Everyone fighting the same target shares one distance map this turn.
+            step = self.engine.distance_maps.next_step(self.entity, self.target.x, self.target.y)
 
-            if self.path:
-                dest_x, dest_y = self.path.pop(0)
+            if step:
+                dest_x, dest_y = step
                 return MovementAction(
                     self.entity, dest_x - self.entity.x, dest_y - self.entity.y, False
                 ).perform()
@@ -165,30 +159,40 @@ class NPC(BaseAI):
     """NPCs wander their maps during the day and go home at night."""
     def __init__(self, entity: Actor, previous_ai: Optional[BaseAI] = None):
         super().__init__(entity)
-        self.path: List[Tuple[int, int]] = []
+        self.path_follower = PathFollower(entity)
         self.current_action: NPCActivity = NPCActivity.WANDER
         self.previous_ai = previous_ai
 
     def go_to_location(self, x, y) -> None:
         """Move the NPC toward a map tile"""
         self.current_action = "moving to location"
-        self.path = self.get_path_to(x, y)
-        if len(self.path) > 0:
-            dest_x, dest_y = self.path.pop(0)
+        step = self.path_follower.next_step(x, y)
+        if step:
+            dest_x, dest_y = step
             return MovementAction(
                 self.entity, dest_x - self.entity.x, dest_y - self.entity.y, False
             ).perform()
 
     def go_home(self):
-        """The character will move until they are on their plot"""
+        """The character will move until they are in their home"""
         if (self.entity.owned_building):
-            target_home_tile_x = self.entity.owned_building.x
-            target_home_tile_y = self.entity.owned_building.y
             self.current_action = "going home"
-            self.go_to_location(target_home_tile_x, target_home_tile_y)
+            home = self.entity.owned_building
+            flow_fields = self.entity.gamemap.flow_fields
+            if flow_fields.covers(home, self.entity.x, self.entity.y):
+                # Homes never move, so the way there is looked up from the map's flow fields.
+                step = flow_fields.next_step(self.entity, home)
+            else:
+                # Too far from home for its flow field, so plan the trip back.
+                step = self.path_follower.next_step(*home.center)
+            if step:
+                dest_x, dest_y = step
+                return MovementAction(
+                    self.entity, dest_x - self.entity.x, dest_y - self.entity.y, False
+                ).perform()
 
     def wander(self):
-        direction_x, direction_y = random.choice(
+        direction_x, direction_y = self.engine.rng.stream(rng.AI).choice(
             [
                 (-1, -1),  # Northwest
                 (0, -1),  # North
@@ -202,6 +206,11 @@ class NPC(BaseAI):
         )
         return BumpAction(self.entity, direction_x, direction_y, False).perform()
 
+    @property
+    def wanders_with_crowd(self) -> bool:
+        """True if this NPC's turn is only a random step, which crowd.wander takes for it."""
+        return self.engine.time_cycle._current_phase < 3
+
     def perform(self) -> None:
         # NPCs wander by default, unless they are going home or home for the night
         if self.engine.time_cycle._current_phase < 3:
@@ -217,6 +226,12 @@ class EvilNPC(NPC):
         self.current_target: Actor = None
         self.murder_cooldown = 0
         self.current_target = None
+
+    @property
+    def wanders_with_crowd(self) -> bool:
+        # Even while wandering, they are on the lookout for their next victim.
+        return False
+
     def seek_victim(self):
         # select a victim
         if self.current_target == None and self.murder_cooldown == 0:
@@ -224,15 +239,15 @@ class EvilNPC(NPC):
             for actor in self.engine.game_map.actors:
                 if actor is not self.entity and actor.is_alive and actor.player_character == False and actor not in self.entity.friends:
                     possible_victims.append(actor)
-            victim = random.choice(list(possible_victims))
+            victim = self.engine.rng.stream(rng.AI).choice(list(possible_victims))
             self.current_target = victim
-            print(f"{self.entity.name} is hunting {self.current_target.name}")
+            logger.debug("%s is hunting %s", self.entity.name, self.current_target.name)
 
         # pathfind to that victim
         if self.current_target:
             x = self.current_target.x
             y = self.current_target.y
-            self.path = self.go_to_location(x, y)
+            self.go_to_location(x, y)
             dx = x - self.entity.x
             dy = y - self.entity.y
             distance = max(abs(dx), abs(dy))
@@ -240,7 +255,7 @@ class EvilNPC(NPC):
             # attack victim
                 AttackAction(self.entity, self.current_target).perform()
                 if not self.current_target.alive:
-                    print("Setting murder cooldown to 3")
+                    logger.debug("Setting murder cooldown to 3")
                     self.murder_cooldown = 3 # wait three days for the next murder
                     self.current_target = None 
         else:
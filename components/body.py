@@ -3,10 +3,13 @@ from enum import Enum
 from typing import Dict, Tuple, List, TYPE_CHECKING
 from components.base_component import BaseComponent
 from copy import deepcopy
-import random
+import rng
+import debug_log
 if TYPE_CHECKING:
     from entity import Actor, Item
 
+logger = debug_log.get_logger(debug_log.BODY)
+
 class BodyPartTypes(Enum):
     HEAD = 0
     TORSO = 1
@@ -64,6 +67,12 @@ class BodyPart():
         """True if this BodyPart can be used to attack, false otherwise"""
         return self._attacks
 
+    def _hp_changed(self) -> None:
+        # The actor's map keeps note of it, so that the next save includes it.
+        game_map = self.actor.placed_map
+        if game_map is not None:
+            game_map.mark_changed(self.actor)
+
     def heal(self, amount: int) -> int:
         if self._hp == self.max_hp:
             return 0
@@ -75,10 +84,12 @@ class BodyPart():
 
         amount_recovered = new_hp_value - self._hp
         self._hp = new_hp_value
+        self._hp_changed()
         return amount_recovered
 
     def take_damage(self, amount: int) -> None:
         self._hp -= amount
+        self._hp_changed()
         # If the body is at zero hp, the entity should die
         if self.parent.total_hp <= 0:
             self.actor.fighter.die()
@@ -103,19 +114,19 @@ class BodyPart():
     
 class BT_Head(BodyPart):
     def __init__(self, name="Head") -> None:
-        super().__init__(name=name, bodypart_type=BodyPartTypes.HEAD, hp=random.randint(20,30), max_damage_lethal=True, attacks=False)
+        super().__init__(name=name, bodypart_type=BodyPartTypes.HEAD, hp=rng.stream(rng.BODY).randint(20,30), max_damage_lethal=True, attacks=False)
 
 class BT_Torso(BodyPart):
     def __init__(self, name="Torso") -> None:
-        super().__init__(name=name, bodypart_type=BodyPartTypes.TORSO, hp=random.randint(40,60), max_damage_lethal=True, attacks=False)
+        super().__init__(name=name, bodypart_type=BodyPartTypes.TORSO, hp=rng.stream(rng.BODY).randint(40,60), max_damage_lethal=True, attacks=False)
 
 class BT_Arm(BodyPart):
     def __init__(self, name="Arm") -> None:
-        super().__init__(name=name, bodypart_type=BodyPartTypes.ARM, hp=random.randint(10,15), max_damage_lethal=False, attacks=True)
+        super().__init__(name=name, bodypart_type=BodyPartTypes.ARM, hp=rng.stream(rng.BODY).randint(10,15), max_damage_lethal=False, attacks=True)
 
 class BT_Leg(BodyPart):
     def __init__(self, name="Leg") -> None:
-        super().__init__(name=name, bodypart_type=BodyPartTypes.LEG, hp=random.randint(20,30), max_damage_lethal=False, attacks=True)
+        super().__init__(name=name, bodypart_type=BodyPartTypes.LEG, hp=rng.stream(rng.BODY).randint(20,30), max_damage_lethal=False, attacks=True)
 
 body_template_humanoid = {
     "head": BT_Head(),
@@ -138,7 +149,7 @@ class Body(BaseComponent):
         else:
             body_template = deepcopy(body_template_humanoid) # The default body template is humanoid
         self.body_parts: dict[str, BodyPart] = body_template
-        print(self.body_parts)
+        logger.debug("Body parts: %s", self.body_parts)
         for part in body_template.values():
             part.parent = self
     @property
@@ -4,7 +4,8 @@ import color
 from components.base_component import BaseComponent
 from render_order import RenderOrder
 import exceptions
-import random
+import rng
+import debug_log
 from combat import Attack
 import components.ai
 if TYPE_CHECKING:
@@ -12,6 +13,8 @@ if TYPE_CHECKING:
     from body import BodyPart
     from combat import Attack
 
+logger = debug_log.get_logger(debug_log.COMBAT)
+
 class Fighter(BaseComponent):
     parent: Actor
     def __init__(self, hp: int, base_defense: int, base_power: int):
@@ -28,6 +31,8 @@ class Fighter(BaseComponent):
     @hp.setter
     def hp(self, value: int) -> None:
         self._hp = max(0, min(value, self.max_hp))
+        if self.parent.placed_map is not None:
+            self.parent.placed_map.update_entity_state(self.parent)
         if self._hp == 0 and self.parent.ai is not None:
             self.die()
 
@@ -53,21 +58,38 @@ class Fighter(BaseComponent):
         else:
             return 0
 
+    def is_seen_by_player(self, *actors: Actor) -> bool:
+        """True if the player is this fighter or one of `actors`, or can see any of them.
+
+        Messages about things the player can not see are never added, so their text is never built.
+        """
+        player = self.engine.player
+        visible = self.engine.game_map.visible
+        return any(
+            actor is player or visible[actor.x, actor.y] for actor in (self.parent, *actors)
+        )
+
     def die(self) -> None:
-        print(f"{self.parent.name} has died")
+        logger.debug("%s has died", self.parent.name)
         if self.engine.player is self.parent:
             death_message: str = "You died!"
+            death_message_args = ()
             death_message_color = color.player_die
         else:
-            death_message = f"{self.parent.name} is dead!"
+            death_message = "{0} is dead!"
+            death_message_args = (self.parent.name,)
             death_message_color = color.enemy_die
+        seen = self.is_seen_by_player()
         self.parent.char = "%"
         self.parent.color = (191, 0, 0)
         self.parent.blocks_movement = False
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
-        self.engine.message_log.add_message(death_message, death_message_color)
+        if seen:
+            self.engine.message_log.add_message(
+                death_message, death_message_color, args=death_message_args
+            )
         self.parent.alive = False
         # self.engine.player.level.add_xp(self.parent.level.xp_given)
 
@@ -75,16 +97,17 @@ class Fighter(BaseComponent):
         # If either this character or their target is dead, skip the attack
         if not self.parent.alive or not target.alive:
             return
+        combat_rng = self.engine.rng.stream(rng.COMBAT)
 
         # If this in an NPC, ensure their AI is set to combatant
         if self.parent.player_character == False and not isinstance(self.parent.ai, components.ai.Combatant):
             previous_ai = self.parent.ai
             self.parent.ai = components.ai.Combatant(entity=self.parent, target=target, previous_ai=previous_ai)
-            print(f"Set {self.parent.name}'s previous AI to {previous_ai}")
+            logger.debug("Set %s's previous AI to %s", self.parent.name, previous_ai)
         if not isinstance(target.ai, components.ai.Combatant):
             target_previous_ai = target.ai
             target.ai = components.ai.Combatant(entity=target, target=self.parent, previous_ai=target_previous_ai)
-            print(f"Set {target.name}'s previous AI to {target_previous_ai}")
+            logger.debug("Set %s's previous AI to %s", target.name, target_previous_ai)
         
          # Raise an exception if there's no target
         if not target:
@@ -97,8 +120,10 @@ class Fighter(BaseComponent):
         else:
             attack = Attack("weapon attack", attacker_equipped_weapon.equippable.power_bonus)
         
-        # Start the message 
-        msg: str = f"{self.parent.name} attacks {target.name} with {attack.name}! "
+        # Start the message, which is only formatted if the player ever sees it
+        seen = self.is_seen_by_player(target)
+        msg: str = "{0} attacks {1} with {2}! "
+        msg_args = (self.parent.name, target.name, attack.name)
 
         # determine hit
         attacker_fighting: float = self.parent.skills.get("fighting").value
@@ -106,20 +131,21 @@ class Fighter(BaseComponent):
         hit = True
         # deal damage
         if hit:
-            skill_damage_bonus: int = random.randint(0, int(attacker_fighting))
+            skill_damage_bonus: int = combat_rng.randint(0, int(attacker_fighting))
             total_damage: int = attack._damage + skill_damage_bonus + self.parent.equipment.power_bonus
             target.fighter.take_damage(total_damage)
-            msg += f"{self.parent.name} deals {total_damage} damage to {target.name}!"
+            msg += "{0} deals {3} damage to {1}!"
+            msg_args += (total_damage,)
         # At this point, the target may be dead
-        print(msg)
-        self.engine.message_log.add_message(msg)
+        if seen:
+            self.engine.message_log.add_message(msg, args=msg_args)
 
         if target.alive == False:
             # If the attacker killed the target, add to their deeds
             self.parent.deeds.characters_murdered = self.parent.deeds.characters_murdered + 1
             if target.evil:
                 self.parent.deeds.evil_entities_slain = self.parent.deeds.evil_entities_slain + 1
-            print(f"{self.parent.name} reverting to {self.parent.ai.previous_ai}")
+            logger.debug("%s reverting to %s", self.parent.name, self.parent.ai.previous_ai)
             self.parent.ai = self.parent.ai.previous_ai
         
         self.previous_target = target
@@ -129,15 +155,16 @@ class Fighter(BaseComponent):
     def attack(self, target: Actor):
         if not self.parent.alive or not target.alive:
             return
+        combat_rng = self.engine.rng.stream(rng.COMBAT)
         # If this in an NPC, ensure their AI is set to combatant
         if self.parent.player_character == False and not isinstance(self.parent.ai, components.ai.Combatant):
             previous_ai = self.parent.ai
             self.parent.ai = components.ai.Combatant(entity=self.parent, target=target, previous_ai=previous_ai)
-            print(f"Set {self.parent.name}'s previous AI to {previous_ai}")
+            logger.debug("Set %s's previous AI to %s", self.parent.name, previous_ai)
         if not isinstance(target.ai, components.ai.Combatant):
             target_previous_ai = target.ai
             target.ai = components.ai.Combatant(entity=target, target=self.parent, previous_ai=target_previous_ai)
-            print(f"Set {target.name}'s previous AI to {target_previous_ai}")
+            logger.debug("Set %s's previous AI to %s", target.name, target_previous_ai)
 
         # Raise an expection for nothing to attack
         if not target:
@@ -146,48 +173,53 @@ class Fighter(BaseComponent):
         # Get attacker usable body part
         usable_body_parts = self.parent.body.usable_body_parts
 
+        seen = self.is_seen_by_player(target)
         if usable_body_parts.__len__() == 0:
-            msg = f"{self.parent.name} tries to attack, but is unable!"
-            self.engine.message_log.add_message(msg)
+            if seen:
+                self.engine.message_log.add_message(
+                    "{0} tries to attack, but is unable!", args=(self.parent.name,)
+                )
 
         else:
             attacker_equipped_weapon = self.parent.equipment.weapon
             if attacker_equipped_weapon is not None:
                 # Select a weapon attack
-                attack: Attack = random.choice(attacker_equipped_weapon.equippable.attacks)
+                attack: Attack = combat_rng.choice(attacker_equipped_weapon.equippable.attacks)
             else:
-                attacking_part: BodyPart = random.choice(usable_body_parts)
-                attack: Attack = random.choice(attackTypes.get(attacking_part.bodypart_type))
+                attacking_part: BodyPart = combat_rng.choice(usable_body_parts)
+                attack: Attack = combat_rng.choice(attackTypes.get(attacking_part.bodypart_type))
 
             # choose an enemy's body part
-            target_part: BodyPart = random.choice(target.body.targetable_body_parts)
-            msg: str = f"{self.parent.name} attacks {target.name}'s {target_part.name} with {attack.name}\n"
+            target_part: BodyPart = combat_rng.choice(target.body.targetable_body_parts)
+            msg: str = "{0} attacks {1}'s {2} with {3}\n"
+            msg_args = (self.parent.name, target.name, target_part.name, attack.name)
 
-            print(msg)
             # determine hit
             attacker_fighting: float = self.parent.skills.get("fighting").value
             target_fighting: float = target.skills.get("fighting").value
-            if random.randint(0, int(attacker_fighting)) > random.randint(0, int(target_fighting)):
+            if combat_rng.randint(0, int(attacker_fighting)) > combat_rng.randint(0, int(target_fighting)):
                 # deal damage
-                skill_damage_bonus: int = random.randint(0, int(attacker_fighting))
+                skill_damage_bonus: int = combat_rng.randint(0, int(attacker_fighting))
                 total_damage: int = attack._damage + skill_damage_bonus + self.parent.equipment.power_bonus
                 target_part.take_damage(total_damage)
                 # At this point, the target may be dead
-                self.engine.message_log.add_message(msg)
+                if seen:
+                    self.engine.message_log.add_message(msg, args=msg_args)
 
                 # If the target is dead, 
                 if target.alive == False:
                     self.parent.deeds.characters_murdered = self.parent.deeds.characters_murdered + 1
                     if target.evil:
                         self.parent.deeds.evil_entities_slain = self.parent.deeds.evil_entities_slain + 1
-                    print(f"{self.parent.name} reverting to {self.parent.ai.previous_ai}")
+                    logger.debug("%s reverting to %s", self.parent.name, self.parent.ai.previous_ai)
                     self.parent.ai = self.parent.ai.previous_ai
                 
                 self.previous_target = target
                 self.parent.skills.get("fighting").increase(0.025)
             else:
-                msg += f"{self.parent.name} missed!"
-                self.engine.message_log.add_message(msg)
+                msg += "{0} missed!"
+                if seen:
+                    self.engine.message_log.add_message(msg, args=msg_args)
 
     def heal(self, amount: int) -> int:
         if self.hp == self.max_hp:
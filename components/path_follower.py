@@ -0,0 +1,129 @@
+from __future__ import annotations
+from collections import deque
+from typing import Deque, Optional, Tuple, TYPE_CHECKING
+from components.base_component import BaseComponent
+from pathfinding import compute_local_path
+
+if TYPE_CHECKING:
+    from entity import Actor
+
+# How far (in tiles) the destination may drift before the path is planned again.
+REPLAN_DISTANCE = 3
+# How many upcoming steps are checked for obstacles each turn.
+LOOKAHEAD_STEPS = 3
+
+
+class PathFollower(BaseComponent):
+    """
+    Keeps a planned route between turns instead of planning a new one every turn.
+
+    Each turn only the next few steps are checked. A blocked stretch is repaired
+    by a short detour back onto the route, and the whole route is only planned
+    again once the destination has moved more than REPLAN_DISTANCE tiles.
+
+    Routes are planned over the map's PathHierarchy as a list of waypoints, and
+    only the legs up to the next few steps are turned into tiles.
+    """
+    parent: Actor
+
+    def __init__(self, entity: Actor):
+        self.parent = entity
+        self.path: Deque[Tuple[int, int]] = deque()
+        # Waypoints after the end of self.path which have not been turned into tiles yet.
+        self.waypoints: Deque[Tuple[int, int]] = deque()
+        self.destination: Optional[Tuple[int, int]] = None
+        # The step handed out last turn, in case the move failed and must be retried.
+        self.last_step: Optional[Tuple[int, int]] = None
+
+    def clear(self) -> None:
+        """Forget the current route."""
+        self.path.clear()
+        self.waypoints.clear()
+        self.destination = None
+        self.last_step = None
+
+    def next_step(self, dest_x: int, dest_y: int) -> Optional[Tuple[int, int]]:
+        """Return the next tile on the way to (dest_x, dest_y), or None if there is no way."""
+        if self.last_step and self.last_step != (self.parent.x, self.parent.y):
+            # Last turn's move did not happen, such as when a door was bumped open.
+            self.path.appendleft(self.last_step)
+
+        if self._needs_replan(dest_x, dest_y):
+            self._replan(dest_x, dest_y)
+        else:
+            self._refine()
+            if not self._repair():
+                self._replan(dest_x, dest_y)
+
+        self.last_step = self.path.popleft() if self.path else None
+        return self.last_step
+
+    def _needs_replan(self, dest_x: int, dest_y: int) -> bool:
+        if self.destination is None or not (self.path or self.waypoints):
+            return True
+        # The route must continue from where the entity actually stands.
+        if self.path:
+            next_x, next_y = self.path[0]
+            if max(abs(next_x - self.parent.x), abs(next_y - self.parent.y)) != 1:
+                return True
+        drift = max(abs(dest_x - self.destination[0]), abs(dest_y - self.destination[1]))
+        return drift > REPLAN_DISTANCE
+
+    def _replan(self, dest_x: int, dest_y: int) -> None:
+        waypoints = self.gamemap.path_hierarchy.plan(
+            (self.parent.x, self.parent.y), (dest_x, dest_y)
+        )
+        self.path = deque()
+        self.waypoints = deque(waypoints or ())
+        self.destination = dest_x, dest_y
+        self._refine()
+
+    def _refine(self) -> None:
+        """Turn waypoints into tiles until the next few steps are known."""
+        while len(self.path) <= LOOKAHEAD_STEPS and self.waypoints:
+            leg_start = self.path[-1] if self.path else (self.parent.x, self.parent.y)
+            waypoint = self.waypoints.popleft()
+            if leg_start == waypoint:
+                continue
+            leg = compute_local_path(self.gamemap, leg_start, waypoint)
+            if not leg:
+                # The rest of the route is cut off.
+                self.waypoints.clear()
+                break
+            self.path.extend(leg)
+
+    def _is_blocked(self, x: int, y: int) -> bool:
+        """True if (x, y) can not be walked onto right now.
+
+        Closed doors are not obstacles, since bumping into them opens them.
+        """
+        game_map = self.gamemap
+        return (
+            not game_map.tiles["walkable"][x, y]
+            or game_map.get_actor_at_location(x, y) is not None
+        )
+
+    def _repair(self) -> bool:
+        """Detour around obstacles on the next few steps.
+
+        Returns False if the route can not be repaired locally.
+        """
+        # The final step is the destination itself, which is often occupied by
+        # whoever is being followed.
+        final_step_known = not self.waypoints
+        window = min(LOOKAHEAD_STEPS, len(self.path) - final_step_known)
+        blocked = [i for i in range(window) if self._is_blocked(*self.path[i])]
+        if not blocked:
+            return True
+
+        # Rejoin the route just past the last obstacle in the window.
+        rejoin_index = blocked[-1] + 1
+        detour = compute_local_path(
+            self.gamemap, (self.parent.x, self.parent.y), self.path[rejoin_index]
+        )
+        if not detour or any(self._is_blocked(*tile) for tile in detour[:-1]):
+            return False
+        for _ in range(rejoin_index + 1):
+            self.path.popleft()
+        self.path.extendleft(reversed(detour))
+        return True
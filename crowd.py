@@ -0,0 +1,78 @@
+"""
+Moving crowds of NPCs together, rather than one at a time.
+
+During the day most NPCs only take a random step each turn. Rather than have each
+of them build a BumpAction, wander() draws every direction in one batch and
+checks them against the map's grids as arrays, then moves everyone who can.
+"""
+from __future__ import annotations
+from typing import Sequence, TYPE_CHECKING
+import numpy as np  # type: ignore
+from observation import DOOR_CLOSED
+import rng
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from entity import Actor
+
+# The eight directions a wanderer may step in, as in NPC.wander.
+DIRECTIONS = np.array(
+    [
+        (-1, -1),  # Northwest
+        (0, -1),  # North
+        (1, -1),  # Northeast
+        (-1, 0),  # West
+        (1, 0),  # East
+        (-1, 1),  # Southwest
+        (0, 1),  # South
+        (1, 1),  # Southeast
+    ],
+    dtype=np.intp,
+)
+
+
+def wander(engine: Engine, wanderers: Sequence[Actor]) -> None:
+    """Have every one of `wanderers` take a random step, as NPC.wander would.
+
+    Steps into walls or off the map are wasted, and bumping a closed door opens it,
+    just as they would be one at a time. Wanderers only step onto tiles which were
+    free of blockers at the start of the turn, and if several pick the same tile the
+    first of them gets it. So two wanderers never swap places, or follow each other
+    into a tile in the same turn.
+    """
+    if not wanderers:
+        return
+    game_map = engine.game_map
+    count = len(wanderers)
+    xs = np.fromiter((actor.x for actor in wanderers), dtype=np.intp, count=count)
+    ys = np.fromiter((actor.y for actor in wanderers), dtype=np.intp, count=count)
+    steps = DIRECTIONS[engine.rng.stream(rng.AI).integers(0, len(DIRECTIONS), size=count)]
+    dest_xs = xs + steps[:, 0]
+    dest_ys = ys + steps[:, 1]
+
+    in_bounds = (dest_xs >= 0) & (dest_xs < game_map.width) & (dest_ys >= 0) & (dest_ys < game_map.height)
+    movers = np.flatnonzero(in_bounds)
+    dest_xs, dest_ys = dest_xs[movers], dest_ys[movers]
+
+    # Walkable tiles cost 1 to cross, plus more for each blocker on them, and walls cost 0.
+    cost = game_map.path_cost[dest_xs, dest_ys]
+    doors = (cost > 1) & (game_map.entity_grids.doors[dest_xs, dest_ys] == DOOR_CLOSED)
+    for x, y in zip(dest_xs[doors].tolist(), dest_ys[doors].tolist()):
+        _open_door(engine, x, y)
+
+    free = cost == 1
+    movers, dest_xs, dest_ys = movers[free], dest_xs[free], dest_ys[free]
+    # np.unique returns where each destination first appears, which is the wanderer who gets it.
+    _, first = np.unique(dest_xs * game_map.height + dest_ys, return_index=True)
+    first.sort()
+    game_map.move_entities([wanderers[i] for i in movers[first].tolist()], dest_xs[first], dest_ys[first])
+
+
+def _open_door(engine: Engine, x: int, y: int) -> None:
+    """Open the door at x and y, as MovementAction does when an actor bumps it."""
+    game_map = engine.game_map
+    door = game_map.get_blocking_entity_at_location(x, y)
+    if door is not None and door.name == "Door":
+        door.blocks_movement = False
+        door.char = ""
+        game_map.set_transparent(x, y, True)
@@ -0,0 +1,164 @@
+"""
+Leveled, categorized logging for debugging the game.
+
+Each part of the game logs to its own category, such as "ai" or "procgen", through
+the standard logging module. Everything is off below WARNING by default, and a
+disabled call only costs a level check since messages are formatted lazily.
+Warnings and errors are always printed to stderr, however logging is configured:
+
+    logger = debug_log.get_logger(debug_log.AI)
+    logger.debug("%s is hunting %s", hunter.name, victim.name)
+
+Levels can be set per category in the NIGHTFALL_LOG environment variable, either
+as a single level ("debug") or a list of categories ("ai=debug,combat=info").
+Records can be kept in an in-memory ring buffer, and written to a file by a
+background thread so that logging never blocks the game on disk.
+"""
+from __future__ import annotations
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from collections import deque
+from typing import Deque, Dict, List, Optional, Union
+
+ROOT_LOGGER = "nightfall"
+
+# Categories
+AI = "ai"
+BODY = "body"
+COMBAT = "combat"
+CONFIG = "config"
+ENGINE = "engine"
+ENTITY = "entity"
+NAMEGEN = "namegen"
+PROCGEN = "procgen"
+SAVE = "save"
+TIME = "time"
+
+LOG_FORMAT = "%(relativeCreated)d %(levelname)s %(name)s: %(message)s"
+RING_BUFFER_CAPACITY = 1000
+
+_root = logging.getLogger(ROOT_LOGGER)
+_root.setLevel(logging.WARNING)
+_root.propagate = False
+# Warnings and errors reach the terminal, as the print() calls these replaced did.
+_console = logging.StreamHandler()
+_console.setLevel(logging.WARNING)
+_console.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+_root.addHandler(_console)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+# Whether shutdown() is registered to run at exit, which is only done once.
+_shutdown_at_exit = False
+# Categories given their own level by configure(), so that it can reset them.
+_configured_categories: List[str] = []
+ring_buffer: Optional[RingBufferHandler] = None
+
+
+def get_logger(category: str) -> logging.Logger:
+    """Return the logger for a category."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent records in memory, such as for an in-game debug view."""
+
+    def __init__(self, capacity: int = RING_BUFFER_CAPACITY):
+        super().__init__()
+        self.records: Deque[logging.LogRecord] = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+    def lines(self) -> List[str]:
+        """Format the buffered records, oldest first."""
+        return [self.format(record) for record in self.records]
+
+
+def configure(
+    level: Union[int, str] = logging.WARNING,
+    categories: Optional[Dict[str, Union[int, str]]] = None,
+    ring_buffer_size: int = 0,
+    log_file: Optional[str] = None,
+) -> None:
+    """
+    Set the log levels and where records go.
+
+    `level` applies to every category, unless overridden in `categories`.
+    If `ring_buffer_size` is more than 0, records are kept in debug_log.ring_buffer.
+    If `log_file` is given, records are appended to it from a background thread.
+    """
+    global ring_buffer, _listener, _shutdown_at_exit
+    shutdown()
+
+    _root.setLevel(_to_level(level))
+    for category in _configured_categories:
+        get_logger(category).setLevel(logging.NOTSET)
+    _configured_categories.clear()
+    for category, category_level in (categories or {}).items():
+        get_logger(category).setLevel(_to_level(category_level))
+        _configured_categories.append(category)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    if ring_buffer_size > 0:
+        ring_buffer = RingBufferHandler(ring_buffer_size)
+        ring_buffer.setFormatter(formatter)
+        _root.addHandler(ring_buffer)
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        _root.addHandler(logging.handlers.QueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, file_handler)
+        _listener.start()
+        # The writer thread does not keep the game running, so flush it on the way out.
+        if not _shutdown_at_exit:
+            atexit.register(shutdown)
+            _shutdown_at_exit = True
+
+
+def configure_from_environment() -> None:
+    """Configure logging from the NIGHTFALL_LOG and NIGHTFALL_LOG_FILE environment variables."""
+    setting = os.environ.get("NIGHTFALL_LOG", "")
+    level: Union[int, str] = logging.WARNING
+    categories: Dict[str, Union[int, str]] = {}
+    for part in filter(None, (part.strip() for part in setting.split(","))):
+        if "=" in part:
+            category, category_level = part.split("=", 1)
+            categories[category.strip()] = category_level.strip()
+        else:
+            level = part
+    configure(
+        level,
+        categories,
+        ring_buffer_size=RING_BUFFER_CAPACITY if setting else 0,
+        log_file=os.environ.get("NIGHTFALL_LOG_FILE"),
+    )
+
+
+def shutdown() -> None:
+    """Flush the background file writer and remove every handler added by configure()."""
+    global ring_buffer, _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    ring_buffer = None
+    for handler in list(_root.handlers):
+        if handler is not _console:
+            _root.removeHandler(handler)
+
+
+def _to_level(level: Union[int, str]) -> int:
+    if isinstance(level, int):
+        return level
+    # getLevelName returns a string such as "Level FOO" for names it does not know.
+    number = logging.getLevelName(level.upper())
+    if not isinstance(number, int):
+        raise ValueError(
+            f"Unknown log level {level!r}, expected one of debug, info, warning, error or critical."
+        )
+    return number
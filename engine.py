@@ -1,43 +1,87 @@
 from __future__ import annotations
-import lzma
-import pickle
-from typing import TYPE_CHECKING
+import debug_log
+from typing import Optional, Tuple, TYPE_CHECKING
 from tcod.console import Console
-from tcod.map import compute_fov
-from tcod import FOV_DIAMOND
+import crowd
 import exceptions
 from message_log import MessageLog
+from pathfinding import DistanceMaps
+from perception import Perception, compute_window_fov
+import rng
+from rng import RandomStreams
+import savefile
 from time_cycles import TimeCycle, NIGHT_FOV_RANGE
 import render_functions
-from components.ai import EvilNPC
+from components.ai import EvilNPC, HostileEnemy, NPC
 if TYPE_CHECKING:
     from entity import Actor
     from game_map import GameMap, GameWorld
     from components.ai import EvilNPC
 
+logger = debug_log.get_logger(debug_log.ENGINE)
+
 class Engine:
     game_map: GameMap
     game_world: GameWorld
     time_cycle: TimeCycle
+    # The save slot this game is saved to, see save_slots.py. Games played without the UI are never saved.
+    save_filename: Optional[str] = None
 
-    def __init__(self, time_cycle: TimeCycle):
+    def __init__(self, time_cycle: TimeCycle, seed: Optional[int] = None):
+        # Every random number in the game is drawn from these streams, so the same seed plays out the same game.
+        self.rng = RandomStreams(seed)
+        rng.activate(self.rng)
         self.message_log = MessageLog()
-        self.mouse_location = (0, 0)
+        self._mouse_location = (0, 0)
+        # Set whenever something on screen may have changed, and cleared once drawn.
+        self.needs_render = True
         self.player: Actor = None
         self.time_cycle = time_cycle
         self.current_fov_radius = 4
+        self.distance_maps = DistanceMaps()
+        self.perception = Perception(self)
+
+    @property
+    def mouse_location(self) -> Tuple[int, int]:
+        return self._mouse_location
+
+    @mouse_location.setter
+    def mouse_location(self, location: Tuple[int, int]) -> None:
+        # The mouse only matters once it points at a different tile.
+        if location != self._mouse_location:
+            self._mouse_location = location
+            self.needs_render = True
 
     def save_as(self, filename: str) -> None:
-        """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
+        """Save this Engine instance as a save file, see savefile.py."""
+        self.message_log.flush_spill()
+        savefile.save(self, filename)
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
+        # Distance maps are only valid for the turn they were built in.
+        self.distance_maps.clear()
+        actors = list(self.game_map.actors)
+        # Work out what every watchful enemy sees in one batch, rather than one at a time.
+        self.perception.observe(
+            actor for actor in actors if isinstance(actor.ai, HostileEnemy)
+        )
+        # NPCs out wandering all take their random steps together.
+        wanderers = [
+            actor for actor in actors
+            if actor is not self.player and isinstance(actor.ai, NPC) and actor.ai.wanders_with_crowd
+        ]
+        crowd.wander(self, wanderers)
+        wandered = set(wanderers)
+        for entity in actors:
+            if entity is self.player:
+                continue
             hunger = entity.body._hunger
             entity.body._hunger = hunger + 1
+            if entity in wandered:
+                continue
             if entity.ai:
+                # Whatever an actor does on its turn may change it, so the next save includes it.
+                self.game_map.mark_changed(entity)
                 # check hunger levels
                 hungry = False
                 if entity.body.hunger >= entity.body.max_hunger:
@@ -50,7 +94,7 @@ class Engine:
                     if isinstance(entity.ai, EvilNPC):
                         if self.game_map.engine.time_cycle.tick_day == 0:
                             entity.ai.murder_cooldown = entity.ai.murder_cooldown -1
-                            print(f"MC is {entity.ai.murder_cooldown}")
+                            logger.debug("MC is %d", entity.ai.murder_cooldown)
                 except exceptions.Impossible:
                     pass  # Ignore impossible action exceptions from AI.
 
@@ -70,14 +114,31 @@ class Engine:
 
         # if self.time_cycle.current_phase_name == "nighttime":
         #     current_radius = 4
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=int(self.current_fov_radius),
-            algorithm=FOV_DIAMOND
+        game_map = self.game_map
+        radius = int(self.current_fov_radius)
+
+        # Nothing the FOV depends on has changed, so it is still correct.
+        fov_key = (self.player.x, self.player.y, radius, game_map.transparent_version)
+        if fov_key == game_map.fov_key:
+            return
+
+        # Nothing beyond the radius can be seen, so only compute the square around the player.
+        window, window_fov = compute_window_fov(
+            game_map.tiles["transparent"], self.player.x, self.player.y, radius
         )
+        if game_map.fov_window is None:
+            game_map.visible[:] = False
+            game_map.mark_dirty((slice(None), slice(None)))
+        else:
+            game_map.visible[game_map.fov_window] = False
+            game_map.mark_dirty(game_map.fov_window)
+        game_map.mark_dirty(window)
+        game_map.visible[window] = window_fov
+        game_map.fov_window = window
+        game_map.fov_key = fov_key
+
         # If a tile is "visible" it should be added to "explored".
-        self.game_map.explored |= self.game_map.visible
+        game_map.explored[window] |= window_fov
     
     def render(self, console: Console) -> None:
         self.game_map.render(console)
@@ -113,4 +174,5 @@ class Engine:
         render_functions.render_time_cycles(
             console=console, x=62, y=45, engine=self
         )
+        self.needs_render = False
         
\ No newline at end of file
@@ -6,6 +6,7 @@ from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union, List, D
 from render_order import RenderOrder
 from namegen import NameGenerator
 from components.deeds import Deeds
+import debug_log
 if TYPE_CHECKING:
     from components.ai import BaseAI
     from components.consumable import Consumable
@@ -22,6 +23,8 @@ if TYPE_CHECKING:
 
 T = TypeVar("T", bound="Entity")
 
+logger = debug_log.get_logger(debug_log.ENTITY)
+
 class Entity:
     """
     A generic object to represent players, enemies, items, etc.
@@ -48,7 +51,7 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
     @property
     def name(self):
         """The entity's name"""
@@ -58,17 +61,66 @@ class Entity:
     def name(self, name) -> str:
         self._name = name
         
+    @property
+    def char(self) -> str:
+        return self._char
+
+    @char.setter
+    def char(self, char: str) -> None:
+        self._char = char
+        if self.placed_map is not None:
+            self.placed_map.update_entity_graphics(self)
+
+    @property
+    def color(self) -> Tuple[int, int, int]:
+        return self._color
+
+    @color.setter
+    def color(self, color: Tuple[int, int, int]) -> None:
+        self._color = color
+        if self.placed_map is not None:
+            self.placed_map.update_entity_graphics(self)
+
+    @property
+    def render_order(self) -> RenderOrder:
+        return self._render_order
+
+    @render_order.setter
+    def render_order(self, render_order: RenderOrder) -> None:
+        self._render_order = render_order
+        if self.placed_map is not None:
+            self.placed_map.update_entity_graphics(self)
+
+    @property
+    def blocks_movement(self) -> bool:
+        """True if other entities cannot move onto this entity's tile."""
+        return self._blocks_movement
+
+    @blocks_movement.setter
+    def blocks_movement(self, blocks_movement: bool) -> None:
+        self._blocks_movement = blocks_movement
+        if self.placed_map is not None:
+            self.placed_map.update_entity_state(self)
+
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    @property
+    def placed_map(self) -> Optional[GameMap]:
+        """The GameMap this entity is standing on, or None if it is held elsewhere (such as an inventory)."""
+        parent = getattr(self, "parent", None)
+        if parent is not None and self in getattr(parent, "entities", ()):
+            return parent
+        return None
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int, spawn_items: List[Item] = []) -> T:
         """Spawn a copy of this instance at the given location."""
         clone = copy.deepcopy(self)
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         clone.initialize()
         return clone 
 
@@ -77,11 +129,14 @@ class Entity:
         self.x = x
         self.y = y
         if gamemap:
-            if hasattr(self, "parent"):  # Possibly uninitialized.
-                if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+            current_map = self.placed_map
+            if current_map is not None and current_map is not gamemap:
+                current_map.remove_entity(self)
             self.parent = gamemap
-            
+            gamemap.add_entity(self)
+        elif self.placed_map is not None:
+            self.placed_map.update_entity_location(self)
+
     def distance(self, x: int, y: int) -> float:
         """
         Return the distance between the current entity and the given (x, y) coordinate.
@@ -91,6 +146,8 @@ class Entity:
         # Move the entity by a given amount
         self.x += dx
         self.y += dy
+        if self.placed_map is not None:
+            self.placed_map.update_entity_location(self)
 
     def initialize(self):
         pass
@@ -128,7 +185,7 @@ class Actor(Entity):
         self.last_name: str = "<Unnamed>"
         self.base_fov = base_fov
 
-        self.ai: Optional[BaseAI] = ai_cls(self)
+        self.ai = ai_cls(self)
 
         self.body: Body = body
         self.body.parent = self
@@ -154,6 +211,28 @@ class Actor(Entity):
         self.friends = friends
         self.alive = True
 
+    @property
+    def ai(self) -> Optional[BaseAI]:
+        """The AI driving this actor. An actor without AI is dead."""
+        return self._ai
+
+    @ai.setter
+    def ai(self, ai: Optional[BaseAI]) -> None:
+        self._ai = ai
+        if self.placed_map is not None:
+            self.placed_map.update_entity_registries(self)
+
+    @property
+    def evil(self) -> bool:
+        """True if this actor is one of the evil characters the player must stop."""
+        return self._evil
+
+    @evil.setter
+    def evil(self, evil: bool) -> None:
+        self._evil = evil
+        if self.placed_map is not None:
+            self.placed_map.update_entity_registries(self)
+
     @property
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions."""
@@ -174,7 +253,7 @@ class Actor(Entity):
         
         self.fighter.max_hp = self.body.total_hp
         self.fighter.hp = self.body.total_hp
-        print (f"Initialized Character - {self._name} at {self.x},{self.y}")
+        logger.debug("Initialized Character - %s at %d,%d", self._name, self.x, self.y)
 
     def set_ai(self, ai: Type[BaseAI]):
         self.ai = ai(self)
@@ -10,7 +10,7 @@ from components.body import Body
 from entity import Actor, Item
 from components.skills import Skill
 import generators.equipment
-import random
+import rng
 if TYPE_CHECKING:
    from entity import Actor
    from engine import Engine
@@ -33,7 +33,7 @@ def create_person(
     )
     person.initialize(first_name, last_name, age)
     skills = {
-        "fighting": Skill(person, "fighting", random.randint(10,20))
+        "fighting": Skill(person, "fighting", rng.stream(rng.BODY).randint(10,20))
     }
     person.skills = skills
 
@@ -0,0 +1,128 @@
+"""Entity graphics kept in arrays, so that a whole map of entities can be drawn at once."""
+from __future__ import annotations
+from typing import Dict, List, Sequence, TYPE_CHECKING
+import numpy as np  # type: ignore
+from tcod.console import Console
+from render_order import RenderOrder
+
+if TYPE_CHECKING:
+    from entity import Entity
+
+
+class RenderBucket:
+    """
+    The entities of a single RenderOrder, with their positions and graphics in parallel arrays.
+
+    Slots are kept packed: removing an entity moves the last entity into its slot.
+    """
+
+    def __init__(self, capacity: int = 16):
+        self.entities: List[Entity] = []
+        self.slots: Dict[Entity, int] = {}
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.ch = np.zeros(capacity, dtype=np.int32)
+        self.fg = np.zeros((capacity, 3), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def _grow(self) -> None:
+        capacity = len(self.x) * 2
+        self.x = np.resize(self.x, capacity)
+        self.y = np.resize(self.y, capacity)
+        self.ch = np.resize(self.ch, capacity)
+        self.fg = np.resize(self.fg, (capacity, 3))
+
+    def add(self, entity: Entity) -> None:
+        if len(self.entities) == len(self.x):
+            self._grow()
+        self.slots[entity] = len(self.entities)
+        self.entities.append(entity)
+        self.update(entity)
+
+    def remove(self, entity: Entity) -> None:
+        slot = self.slots.pop(entity)
+        last = self.entities.pop()
+        if last is not entity:
+            # Fill the hole with the last entity.
+            self.entities[slot] = last
+            self.slots[last] = slot
+            self.x[slot] = self.x[len(self.entities)]
+            self.y[slot] = self.y[len(self.entities)]
+            self.ch[slot] = self.ch[len(self.entities)]
+            self.fg[slot] = self.fg[len(self.entities)]
+
+    def update(self, entity: Entity) -> None:
+        """Copy an entity's position and graphics into its slot."""
+        slot = self.slots[entity]
+        self.x[slot] = entity.x
+        self.y[slot] = entity.y
+        # Entities with no character (such as open doors) are never drawn.
+        self.ch[slot] = ord(entity.char[0]) if entity.char else 0
+        self.fg[slot] = entity.color
+
+
+class EntityLayer:
+    """
+    Draws a map's entities, sorted into a bucket per RenderOrder.
+
+    Buckets are drawn from lowest to highest render order, so actors are drawn over
+    items and items over corpses. Each bucket is drawn with one vectorized write.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[RenderOrder, RenderBucket] = {
+            render_order: RenderBucket() for render_order in RenderOrder
+        }
+        # The bucket each entity is in, so it can be found again once its render order changes.
+        self._orders: Dict[Entity, RenderOrder] = {}
+
+    def add(self, entity: Entity) -> None:
+        if entity in self._orders:
+            self.update(entity)
+            return
+        self._orders[entity] = entity.render_order
+        self.buckets[entity.render_order].add(entity)
+
+    def remove(self, entity: Entity) -> None:
+        render_order = self._orders.pop(entity, None)
+        if render_order is not None:
+            self.buckets[render_order].remove(entity)
+
+    def update(self, entity: Entity) -> None:
+        """Refresh an entity after it moved or its graphics or render order changed."""
+        render_order = self._orders.get(entity)
+        if render_order is None:
+            return
+        if render_order is not entity.render_order:
+            self.remove(entity)
+            self.add(entity)
+        else:
+            self.buckets[render_order].update(entity)
+
+    def move(self, entities: Sequence[Entity], xs: np.ndarray, ys: np.ndarray) -> None:
+        """Copy the new positions of many entities at once, after they moved to xs and ys."""
+        moved: Dict[RenderOrder, List[int]] = {}
+        for index, entity in enumerate(entities):
+            render_order = self._orders.get(entity)
+            if render_order is not None:
+                moved.setdefault(render_order, []).append(index)
+        for render_order, indices in moved.items():
+            bucket = self.buckets[render_order]
+            slots = [bucket.slots[entities[index]] for index in indices]
+            bucket.x[slots] = xs[indices]
+            bucket.y[slots] = ys[indices]
+
+    def render(self, console: Console, visible: np.ndarray) -> None:
+        """Draw every entity standing on a visible tile."""
+        for render_order in sorted(RenderOrder, key=lambda order: order.value):
+            bucket = self.buckets[render_order]
+            count = len(bucket)
+            if not count:
+                continue
+            x, y, ch = bucket.x[:count], bucket.y[:count], bucket.ch[:count]
+            shown = visible[x, y] & (ch != 0)
+            x, y = x[shown], y[shown]
+            console.tiles_rgb["ch"][x, y] = ch[shown]
+            console.tiles_rgb["fg"][x, y] = bucket.fg[:count][shown]
@@ -0,0 +1,304 @@
+"""
+A Gym-style environment for training agents to play Nightfall.
+
+    env = NightfallEnv()
+    observation, info = env.reset(seed=42)
+    observation, reward, terminated, truncated, info = env.step(action)
+
+Actions are integers, see ACTIONS. Observations are uint8 arrays of shape
+(channels, width, height), with the channels listed in observation.CHANNELS.
+They cover the whole map, or a square around the player with `crop_radius`.
+
+VectorEnv runs several environments in worker processes, which write their
+observations straight into one shared memory buffer.
+"""
+from __future__ import annotations
+import multiprocessing
+import multiprocessing.connection
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import numpy as np  # type: ignore
+from actions import Action, BumpAction, PickupAction, WaitAction
+import debug_log
+import exceptions
+import setup_game
+from game_settings import GameConfig
+from observation import ObservationEncoder
+from snapshot import EngineSnapshot
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+# Action 0 waits, the next eight move (or open doors) in each direction, the eight
+# after that attack in each direction, and the last picks up items.
+WAIT = 0
+MOVE = 1
+ATTACK = MOVE + len(DIRECTIONS)
+PICKUP = ATTACK + len(DIRECTIONS)
+ACTIONS = PICKUP + 1
+
+# Rewards
+REWARD_EVIL_SLAIN = 1.0
+REWARD_DEATH = -1.0
+
+# How many steps an episode lasts before it is truncated.
+DEFAULT_MAX_STEPS = 2000
+
+
+def observation_shape(
+    map_width: Optional[int] = None,
+    map_height: Optional[int] = None,
+    crop_radius: Optional[int] = None,
+) -> Tuple[int, int, int]:
+    """The shape of the observations for a map size, the configured size by default."""
+    config = GameConfig.load_config_json()
+    return ObservationEncoder(crop_radius).shape(
+        map_width or config["game"]["map"]["width"],
+        map_height or config["game"]["map"]["height"],
+    )
+
+
+class NightfallEnv:
+    """A single game of Nightfall, played one action at a time."""
+
+    def __init__(
+        self,
+        max_steps: int = DEFAULT_MAX_STEPS,
+        npc_count: Optional[int] = None,
+        map_width: Optional[int] = None,
+        map_height: Optional[int] = None,
+        crop_radius: Optional[int] = None,
+        fixed_world: bool = False,
+    ):
+        """If `fixed_world` is True, the world is only generated on the first reset.
+        Every later reset restores a snapshot of it, which is much faster.
+        """
+        self.max_steps = max_steps
+        self.npc_count = npc_count
+        self.map_width = map_width
+        self.map_height = map_height
+        self.encoder = ObservationEncoder(crop_radius)
+        self.observation_shape = observation_shape(map_width, map_height, crop_radius)
+        self.fixed_world = fixed_world
+        self.snapshot: Optional[EngineSnapshot] = None
+        self.engine: Optional[Engine] = None
+        self.steps = 0
+        # Seeds each episode, so that resetting with a seed replays every episode after it too.
+        self.np_random = np.random.default_rng()
+
+    def reset(
+        self, seed: Optional[int] = None, out: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Start a new game, returning its first observation.
+
+        If `out` is given, the observation is written into it instead of a new array.
+        """
+        if seed is not None:
+            self.np_random = np.random.default_rng(seed)
+        episode_seed = int(self.np_random.integers(2**63))
+        if self.snapshot is not None:
+            self.engine = self.snapshot.restore()
+            self.engine.rng.reseed(episode_seed)
+        else:
+            self.engine = setup_game.new_game(
+                "Agent",
+                "Player",
+                30,
+                map_width=self.map_width,
+                map_height=self.map_height,
+                npc_count=self.npc_count,
+                world_file=None,
+                seed=episode_seed,
+            )
+            if self.fixed_world:
+                self.snapshot = EngineSnapshot(self.engine)
+        self.steps = 0
+        return self.observe(out), self._info()
+
+    def step(
+        self, action: int, out: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, float, bool, bool, Dict[str, Any]]:
+        """Have the player take `action`, then let the rest of the world take its turn.
+
+        Returns the observation, reward, whether the game ended, whether the episode
+        ran out of steps, and extra information.
+        """
+        engine = self.engine
+        player = engine.player
+        evil_slain = player.deeds.evil_entities_slain
+
+        # Actions which are impossible, such as walking into a wall, do not use up a turn.
+        if self._perform(self._to_action(action)):
+            engine.handle_enemy_turns()
+            engine.update_fov()
+        self.steps += 1
+
+        reward = (player.deeds.evil_entities_slain - evil_slain) * REWARD_EVIL_SLAIN
+        terminated = False
+        if not player.is_alive:
+            reward += REWARD_DEATH
+            terminated = True
+        elif not engine.game_map.get_evil_characters():
+            terminated = True
+        truncated = not terminated and self.steps >= self.max_steps
+        return self.observe(out), reward, terminated, truncated, self._info()
+
+    def observe(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the current observation, written into `out` if it is given."""
+        return self.encoder.encode(self.engine, out)
+
+    def _to_action(self, action: int) -> Action:
+        player = self.engine.player
+        if not 0 <= action < ACTIONS:
+            raise ValueError(f"Action must be between 0 and {ACTIONS - 1}, not {action}.")
+        if action == WAIT:
+            return WaitAction(player)
+        if action == PICKUP:
+            return PickupAction(player)
+        force_attack = action >= ATTACK
+        dx, dy = DIRECTIONS[(action - MOVE) % len(DIRECTIONS)]
+        return BumpAction(player, dx, dy, force_attack)
+
+    def _perform(self, action: Action) -> bool:
+        """Perform the player's action as MainGameEventHandler would, returning True if it used a turn."""
+        engine = self.engine
+        try:
+            action.perform()
+        except exceptions.Impossible as exc:
+            engine.message_log.add_message(exc.args[0])
+            return False
+        if isinstance(action, BumpAction):
+            engine.player.body._hunger = engine.player.body.hunger + 1
+        if not isinstance(action, PickupAction):
+            engine.time_cycle.tick()
+        return True
+
+    def _info(self) -> Dict[str, Any]:
+        engine = self.engine
+        return {
+            "steps": self.steps,
+            "tick": engine.time_cycle.tick_global,
+            "phase": engine.time_cycle.current_phase_name,
+            "hp": engine.player.fighter.hp,
+        }
+
+
+def _worker(
+    connection: multiprocessing.connection.Connection,
+    shared_memory_name: str,
+    index: int,
+    num_envs: int,
+    env_kwargs: Dict[str, Any],
+) -> None:
+    """Run one environment, writing its observations into its slot of the shared buffer."""
+    # Workers may be spawned rather than forked, so they set up logging for themselves.
+    debug_log.configure_from_environment()
+    env = NightfallEnv(**env_kwargs)
+    memory = shared_memory.SharedMemory(name=shared_memory_name)
+    observations = np.ndarray((num_envs, *env.observation_shape), dtype=np.uint8, buffer=memory.buf)
+    out = observations[index]
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == "step":
+                _, reward, terminated, truncated, info = env.step(data, out)
+                if terminated or truncated:
+                    # Start over straight away, so the observation is the first of the next episode.
+                    info["final_info"] = dict(info)
+                    _, reset_info = env.reset(out=out)
+                    info.update(reset_info)
+                connection.send((reward, terminated, truncated, info))
+            elif command == "reset":
+                _, info = env.reset(seed=data, out=out)
+                connection.send(info)
+            elif command == "close":
+                break
+    finally:
+        del observations, out
+        memory.close()
+        connection.close()
+
+
+class VectorEnv:
+    """
+    Runs `num_envs` environments in worker processes and steps them together.
+
+    Every worker writes its observation into its own slot of one shared memory
+    buffer, so observations are never pickled between processes. The arrays
+    returned by reset() and step() are views of that buffer, and are overwritten
+    by the next call. Environments which finish an episode are reset straight away.
+    """
+
+    def __init__(self, num_envs: int, start_method: Optional[str] = None, **env_kwargs: Any):
+        self.num_envs = num_envs
+        self.observation_shape = observation_shape(
+            env_kwargs.get("map_width"), env_kwargs.get("map_height"), env_kwargs.get("crop_radius")
+        )
+        shape = (num_envs, *self.observation_shape)
+        self._memory = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        self.observations = np.ndarray(shape, dtype=np.uint8, buffer=self._memory.buf)
+
+        context = multiprocessing.get_context(start_method)
+        self._connections: List[multiprocessing.connection.Connection] = []
+        self._processes = []
+        for index in range(num_envs):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(child_connection, self._memory.name, index, num_envs, env_kwargs),
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+            self._connections.append(parent_connection)
+            self._processes.append(process)
+        self.closed = False
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Reset every environment. Environment i is seeded with `seed + i`."""
+        for index, connection in enumerate(self._connections):
+            connection.send(("reset", None if seed is None else seed + index))
+        infos = [connection.recv() for connection in self._connections]
+        return self.observations, infos
+
+    def step(
+        self, actions: Sequence[int]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """Step every environment with its action, returning the results as arrays."""
+        for connection, action in zip(self._connections, actions):
+            connection.send(("step", int(action)))
+        results = [connection.recv() for connection in self._connections]
+        rewards, terminated, truncated, infos = zip(*results)
+        return (
+            self.observations,
+            np.array(rewards, dtype=np.float32),
+            np.array(terminated, dtype=bool),
+            np.array(truncated, dtype=bool),
+            list(infos),
+        )
+
+    def close(self) -> None:
+        """Stop the workers and free the shared memory."""
+        if self.closed:
+            return
+        for connection in self._connections:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=1)
+        for connection in self._connections:
+            connection.close()
+        del self.observations
+        self._memory.close()
+        self._memory.unlink()
+        self.closed = True
+
+    def __enter__(self) -> VectorEnv:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
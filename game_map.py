@@ -1,10 +1,19 @@
 from __future__ import annotations
-from typing import Iterable, Iterator, List, Optional, TYPE_CHECKING
+from typing import AbstractSet, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
 import numpy as np  # type: ignore
 from tcod.console import Console
 from entity import Actor, Item
+from entity_layer import EntityLayer
+from observation import EntityGrids
+from pathfinding import FlowFields, PathHierarchy
 import tile_types
 
+# Extra pathfinding cost of a tile occupied by an entity that blocks movement.
+# A lower number means more enemies will crowd behind each other in
+# hallways.  A higher number means enemies will take longer paths in
+# order to surround the player.
+BLOCKED_TILE_COST = 10
+
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
@@ -16,7 +25,31 @@ class GameMap:
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
+        # Every entity on the map, in the order they were added.
+        self.entities: Dict[Entity, None] = {}
+        # Spatial index of entities keyed by their (x, y) location, along with
+        # the location each entity was last indexed at so it can be moved.
+        self._entities_by_location: Dict[Tuple[int, int], Dict[Entity, None]] = {}
+        self._entity_locations: Dict[Entity, Tuple[int, int]] = {}
+        # Typed registries, kept up to date as entities are added, removed,
+        # killed or turned evil so that callers never filter self.entities.
+        # These, the spatial index and self.entities are dicts used as ordered sets, so that
+        # actors take their turns in the same order every time a seed is replayed.
+        self._living_actors: Dict[Actor, None] = {}
+        self._corpses: Dict[Actor, None] = {}
+        self._items: Dict[Item, None] = {}
+        self._evil_actors: Dict[Actor, None] = {}
+        # Built lazily once the map is generated, then updated a tile at a time.
+        self._path_cost: Optional[np.ndarray] = None
+        # Incremented whenever tiles change walkability, to expire cached fields.
+        self.walkable_version = 0
+        self.flow_fields = FlowFields(self)
+        # Incremented whenever tiles change transparency, to expire the cached FOV.
+        self.transparent_version = 0
+        # What the player's FOV was last computed for, and the window it covered.
+        self.fov_key: Optional[Tuple[int, int, int, int]] = None
+        self.fov_window: Optional[Tuple[slice, slice]] = None
+        self.path_hierarchy = PathHierarchy(self)
         self.buildings: List[Building]= []
         self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
         self.visible = np.full(
@@ -26,6 +59,20 @@ class GameMap:
             (width, height), fill_value=False, order="F"
         )  # Tiles the player has seen before
         self.downstairs_location = (0, 0)
+        # The tiles as last drawn, kept between frames so that only the regions
+        # marked dirty since then need to be drawn again.
+        self._map_layer: Optional[np.ndarray] = None
+        self._dirty_regions: List[Tuple[slice, slice]] = []
+        # Entity graphics by render order, drawn over the map layer.
+        self.entity_layer = EntityLayer()
+        # Per tile counts of actors, items, doors and so on, for observations.
+        self.entity_grids = EntityGrids(width, height)
+        # Entities which changed since the game was last saved, so that saves only
+        # encode those. Moving alone does not count, as saves hold every position.
+        self.changed_entities: Dict[Entity, None] = {}
+
+        for entity in entities:
+            self.add_entity(entity)
 
     @property
     def gamemap(self) -> GameMap:
@@ -33,40 +80,243 @@ class GameMap:
 
     @property
     def actors(self) -> Iterator[Actor]:
-        """Iterate over this maps living actors."""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+        """Iterate over this maps living actors.
+
+        A snapshot is iterated, so actors may die or be removed along the way.
+        """
+        yield from list(self._living_actors)
+
+    @property
+    def corpses(self) -> Iterator[Actor]:
+        """Iterate over the remains of this maps dead actors."""
+        yield from list(self._corpses)
 
     @property
     def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+        yield from list(self._items)
+
+    @property
+    def path_cost(self) -> np.ndarray:
+        """The movement cost of every tile, for use as a pathfinding graph.
+
+        Unwalkable tiles cost 0 (blocked). Walkable tiles cost 1, plus
+        BLOCKED_TILE_COST for every entity on them that blocks movement.
+        This array is kept in sync as entities move, so it must not be modified.
+        """
+        if self._path_cost is None:
+            self._path_cost = np.array(self.tiles["walkable"], dtype=np.int16, order="F")
+            for entity in self.entities:
+                if entity.blocks_movement and self._path_cost[entity.x, entity.y]:
+                    self._path_cost[entity.x, entity.y] += BLOCKED_TILE_COST
+        return self._path_cost
+
+    def invalidate_path_cost(self) -> None:
+        """Discard the path cost array and cached fields. Call this after changing tiles directly."""
+        self._path_cost = None
+        self.walkable_version += 1
+
+    def set_transparent(self, x: int, y: int, transparent: bool) -> None:
+        """Change whether a tile blocks FOV, such as when a door opens."""
+        if self.tiles["transparent"][x, y] != transparent:
+            self.tiles["transparent"][x, y] = transparent
+            self.transparent_version += 1
+
+    def mark_dirty(self, region: Tuple[slice, slice]) -> None:
+        """Mark a region of the map as needing to be drawn again, such as after the FOV changed."""
+        if self._map_layer is not None:
+            self._dirty_regions.append(region)
+
+    def _refresh_map_layer(self) -> np.ndarray:
+        """Redraw the dirty regions of the cached map layer and return it."""
+        if self._map_layer is None:
+            self._dirty_regions = [(slice(None), slice(None))]
+            self._map_layer = np.empty((self.width, self.height), dtype=tile_types.graphic_dt, order="F")
+        for region in self._dirty_regions:
+            self._map_layer[region] = np.select(
+                condlist=[self.visible[region], self.explored[region]],
+                choicelist=[self.tiles["light"][region], self.tiles["dark"][region]],
+                default=tile_types.SHROUD,
+            )
+        self._dirty_regions.clear()
+        return self._map_layer
+
+    def update_path_cost(self, x: int, y: int) -> None:
+        """Recompute the path cost of a single tile after its blockers changed."""
+        if self._path_cost is None or not self.in_bounds(x, y):
+            return
+        if not self.tiles["walkable"][x, y]:
+            self._path_cost[x, y] = 0
+            return
+        blockers = sum(
+            1 for entity in self.get_entities_at_location(x, y) if entity.blocks_movement
+        )
+        self._path_cost[x, y] = 1 + blockers * BLOCKED_TILE_COST
+
+    def mark_changed(self, entity: Entity) -> None:
+        """Note that an entity changed in a way the next save must include."""
+        self.changed_entities[entity] = None
+
+    def take_changed_entities(self) -> List[Entity]:
+        """Return the entities which changed since this was last called, and start over."""
+        changed = list(self.changed_entities)
+        self.changed_entities = {}
+        return changed
+
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map, indexing it at its current location."""
+        self.entities[entity] = None
+        self.mark_changed(entity)
+        self.update_entity_location(entity)
+        self._register(entity)
+        self.entity_layer.add(entity)
+        self.entity_grids.update(entity)
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map and from the location index."""
+        self.entities.pop(entity, None)
+        self.mark_changed(entity)
+        location = self._entity_locations.pop(entity, None)
+        if location is not None:
+            self._unindex(entity, location)
+            if entity.blocks_movement:
+                self.update_path_cost(*location)
+        self._unregister(entity)
+        self.entity_layer.remove(entity)
+        self.entity_grids.remove(entity)
+
+    def update_entity_registries(self, entity: Entity) -> None:
+        """Re-file an entity after its living or evil state has changed."""
+        if entity in self.entities:
+            self._unregister(entity)
+            self._register(entity)
+            self.entity_grids.update(entity)
+            self.mark_changed(entity)
+
+    def _register(self, entity: Entity) -> None:
+        if isinstance(entity, Actor):
+            if entity.is_alive:
+                self._living_actors[entity] = None
+                if entity.evil:
+                    self._evil_actors[entity] = None
+            else:
+                self._corpses[entity] = None
+        elif isinstance(entity, Item):
+            self._items[entity] = None
+
+    def _unregister(self, entity: Entity) -> None:
+        self._living_actors.pop(entity, None)
+        self._corpses.pop(entity, None)
+        self._items.pop(entity, None)
+        self._evil_actors.pop(entity, None)
+
+    def update_entity_location(self, entity: Entity) -> None:
+        """Re-index an entity after its x and y have changed."""
+        new_location = (entity.x, entity.y)
+        old_location = self._entity_locations.get(entity)
+        if old_location == new_location:
+            return
+        self._reindex(entity, old_location, new_location)
+        if entity.blocks_movement:
+            if old_location is not None:
+                self.update_path_cost(*old_location)
+            self.update_path_cost(*new_location)
+        self.entity_layer.update(entity)
+        if entity in self.entities:
+            self.entity_grids.update(entity)
+
+    def move_entities(self, entities: Sequence[Entity], xs: np.ndarray, ys: np.ndarray) -> None:
+        """Move many blocking entities at once, such as a crowd of wandering NPCs.
+
+        Every destination must be walkable, free of blockers and different
+        from the others, so the path costs can be updated in one go.
+        """
+        old_xs = np.fromiter((entity.x for entity in entities), dtype=np.intp, count=len(entities))
+        old_ys = np.fromiter((entity.y for entity in entities), dtype=np.intp, count=len(entities))
+        for entity, x, y in zip(entities, xs.tolist(), ys.tolist()):
+            old_location = self._entity_locations.get(entity)
+            entity.x, entity.y = x, y
+            self._reindex(entity, old_location, (x, y))
+        self.entity_layer.move(entities, xs, ys)
+        self.entity_grids.move(entities, xs, ys)
+        if self._path_cost is not None:
+            # Several of them may have left the same tile, so np.subtract.at counts each one.
+            np.subtract.at(self._path_cost, (old_xs, old_ys), BLOCKED_TILE_COST)
+            self._path_cost[xs, ys] += BLOCKED_TILE_COST
+
+    def rebuild_entity_indexes(self) -> None:
+        """Rebuild the spatial index, path costs and entity arrays from self.entities, such as after loading a save."""
+        self._entities_by_location = {}
+        self._entity_locations = {}
+        self._path_cost = None
+        self._map_layer = None
+        self._dirty_regions = []
+        self.entity_layer = EntityLayer()
+        self.entity_grids = EntityGrids(self.width, self.height)
+        self.changed_entities = {}
+        for entity in self.entities:
+            self._reindex(entity, None, (entity.x, entity.y))
+            self.entity_layer.add(entity)
+            self.entity_grids.update(entity)
+
+    def _reindex(
+        self, entity: Entity, old_location: Optional[Tuple[int, int]], new_location: Tuple[int, int]
+    ) -> None:
+        if old_location is not None:
+            self._unindex(entity, old_location)
+        self._entity_locations[entity] = new_location
+        self._entities_by_location.setdefault(new_location, {})[entity] = None
+
+    def update_entity_state(self, entity: Entity) -> None:
+        """Refresh an entity after it started or stopped blocking movement, or its HP changed."""
+        self.update_path_cost(entity.x, entity.y)
+        self.entity_grids.update(entity)
+        self.mark_changed(entity)
+
+    def update_entity_graphics(self, entity: Entity) -> None:
+        """Refresh how an entity is drawn after its char, color or render order changed."""
+        self.entity_layer.update(entity)
+        self.mark_changed(entity)
+
+    def _unindex(self, entity: Entity, location: Tuple[int, int]) -> None:
+        entities_at_location = self._entities_by_location.get(location)
+        if entities_at_location is None:
+            return
+        entities_at_location.pop(entity, None)
+        if not entities_at_location:
+            del self._entities_by_location[location]
+
+    def get_entities_at_location(self, x: int, y: int) -> AbstractSet[Entity]:
+        """Return the entities at x and y, in the order they arrived there."""
+        entities_at_location = self._entities_by_location.get((x, y))
+        if entities_at_location is None:
+            return frozenset()
+        return entities_at_location.keys()
+
+    def get_items_at_location(self, x: int, y: int) -> List[Item]:
+        """Return the items lying at x and y."""
+        return [
+            entity
+            for entity in self.get_entities_at_location(x, y)
+            if isinstance(entity, Item)
+        ]
+
     def get_blocking_entity_at_location(
         self, location_x: int, location_y: int,
     ) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
+        for entity in self.get_entities_at_location(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
 
         return None
 
     def get_evil_characters(self) -> List[Actor]:
-        living_evil_npcs = []
-        for actor in self.actors:
-            if actor.evil == True and actor.is_alive:
-                living_evil_npcs.append(actor)
-        return living_evil_npcs
+        """Return the living evil actors on this map."""
+        return list(self._evil_actors)
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at_location(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         return None
 
     def in_bounds(self, x: int, y: int) -> bool:
@@ -80,21 +330,11 @@ class GameMap:
        If a tile is in the "visible" array, then draw it with the "light" colors.
        If it isn't, but it's in the "explored" array, then draw it with the "dark" colors.
        Otherwise, the default is "SHROUD".
+
+       Tiles are only recomputed where the map was marked dirty since the last frame.
        """
-       console.tiles_rgb[0 : self.width, 0 : self.height] = np.select(
-           condlist=[self.visible, self.explored],
-           choicelist=[self.tiles["light"], self.tiles["dark"]],
-           default=tile_types.SHROUD,
-       )
-       entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
-        )
-       for entity in entities_sorted_for_rendering:
-           # Only print entities that are in the FOV
-           if self.visible[entity.x, entity.y]:
-                console.print(
-                    x=entity.x, y=entity.y, string=entity.char, fg=entity.color
-                )
+       console.tiles_rgb[0 : self.width, 0 : self.height] = self._refresh_map_layer()
+       self.entity_layer.render(console, self.visible)
 
 class GameWorld:
     """
@@ -110,7 +350,8 @@ class GameWorld:
         max_rooms: int,
         room_min_size: int,
         room_max_size: int,
-        current_floor: int = 0
+        current_floor: int = 0,
+        npc_count: Optional[int] = None,
     ):
         self.engine = engine
 
@@ -124,6 +365,9 @@ class GameWorld:
 
         self.current_floor = current_floor
 
+        # How many residents to place, or None for one per house.
+        self.npc_count = npc_count
+
     def generate_map(self) -> None:
         from procgen import generate_area_map
 
@@ -133,5 +377,6 @@ class GameWorld:
             map_width=self.map_width,
             map_height=self.map_height,
             engine=self.engine,
+            npc_count=self.npc_count,
         )
         
\ No newline at end of file
@@ -1,4 +1,7 @@
 import json
+import debug_log
+
+logger = debug_log.get_logger(debug_log.CONFIG)
 
 class GameConfig():
     map_width: int = 80
@@ -8,6 +11,6 @@ class GameConfig():
         with open("json/game_config.json", "r") as settings_file:
             data = json.load(settings_file)
             for key in data.keys():
-                print(f"{key}: {data[key]}")
+                logger.debug("%s: %s", key, data[key])
             
             return data
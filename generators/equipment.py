@@ -1,4 +1,4 @@
-import random
+import rng
 from entity import Item
 from components.equippable import Equippable, EquipmentType, EquippableType
 from components.body import BodyPartTypes
@@ -6,7 +6,7 @@ from components.body import BodyPartTypes
 clothing_colors = ["Black", "Gray", "Red", "Green", "Blue"]
 
 def generate_pants():
-    color = random.choice(clothing_colors)
+    color = rng.stream(rng.EQUIPMENT).choice(clothing_colors)
     generated_equippable=Equippable(
         equippable_type=EquippableType.WORN_ARTICLE,
         equipment_type=EquipmentType.CLOTHES,
@@ -23,7 +23,7 @@ def generate_pants():
     return pants
 
 def generate_jacket():
-    color = random.choice(clothing_colors)
+    color = rng.stream(rng.EQUIPMENT).choice(clothing_colors)
     generated_equippable=Equippable(
         equippable_type=EquippableType.WORN_ARTICLE,
         equipment_type=EquipmentType.CLOTHES,
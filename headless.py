@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Run the simulation without a window, and report how fast it ran.
+
+    python headless.py --ticks 2000 --seed 42 --npcs 200
+
+Each tick the NPCs take their turns, the player's FOV is updated and the time cycle
+advances, as they would if the player waited every turn. Useful for sizing hardware
+and catching performance regressions.
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, Optional, TYPE_CHECKING
+import debug_log
+import setup_game
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None  # type: ignore
+
+# The parts of each tick which are timed separately.
+STAGES = ("enemy_turns", "update_fov", "time_cycle")
+
+
+class SimulationReport:
+    """Timings and memory use collected by run()."""
+
+    def __init__(self, ticks: int, npc_count: int):
+        self.ticks = ticks
+        self.npc_count = npc_count
+        self.setup_seconds = 0.0
+        self.total_seconds = 0.0
+        # Seconds spent in each stage of a tick, over the whole run.
+        self.stage_seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        # Ticks run and seconds spent in each phase of the day (dawn, daytime...).
+        self.phase_ticks: Dict[str, int] = defaultdict(int)
+        self.phase_seconds: Dict[str, float] = defaultdict(float)
+        self.peak_rss_kb: Optional[int] = None
+        self.peak_traced_kb: Optional[int] = None
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.total_seconds if self.total_seconds else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "ticks": self.ticks,
+            "npc_count": self.npc_count,
+            "setup_seconds": self.setup_seconds,
+            "total_seconds": self.total_seconds,
+            "ticks_per_second": self.ticks_per_second,
+            "stage_seconds": self.stage_seconds,
+            "phase_ticks_per_second": {
+                phase: self.phase_ticks[phase] / seconds if seconds else 0.0
+                for phase, seconds in self.phase_seconds.items()
+            },
+            "peak_rss_kb": self.peak_rss_kb,
+            "peak_traced_kb": self.peak_traced_kb,
+        }
+
+    def __str__(self) -> str:
+        lines = [
+            f"{self.ticks} ticks with {self.npc_count} NPCs in {self.total_seconds:.3f}s "
+            f"({self.ticks_per_second:.1f} ticks/sec), setup took {self.setup_seconds:.3f}s",
+            "Stages:",
+        ]
+        for stage, seconds in self.stage_seconds.items():
+            share = seconds / self.total_seconds * 100 if self.total_seconds else 0.0
+            per_tick = seconds / self.ticks * 1000 if self.ticks else 0.0
+            lines.append(f"  {stage:<12} {seconds:8.3f}s {share:5.1f}% {per_tick:8.3f}ms/tick")
+        lines.append("Phases of the day:")
+        for phase, seconds in self.phase_seconds.items():
+            ticks = self.phase_ticks[phase]
+            lines.append(f"  {phase:<12} {ticks:6d} ticks {ticks / seconds if seconds else 0.0:10.1f} ticks/sec")
+        if self.peak_rss_kb is not None:
+            lines.append(f"Peak RSS: {self.peak_rss_kb / 1024:.1f} MiB")
+        if self.peak_traced_kb is not None:
+            lines.append(f"Peak traced Python allocations: {self.peak_traced_kb / 1024:.1f} MiB")
+        return "\n".join(lines)
+
+
+def tick(engine: Engine, report: Optional[SimulationReport] = None) -> None:
+    """Advance the simulation by one tick, as if the player waited."""
+    phase = engine.time_cycle.current_phase_name
+    start = time.perf_counter()
+    engine.handle_enemy_turns()
+    after_turns = time.perf_counter()
+    engine.update_fov()
+    after_fov = time.perf_counter()
+    engine.time_cycle.tick()
+    end = time.perf_counter()
+    if report is not None:
+        report.stage_seconds["enemy_turns"] += after_turns - start
+        report.stage_seconds["update_fov"] += after_fov - after_turns
+        report.stage_seconds["time_cycle"] += end - after_fov
+        report.phase_ticks[phase] += 1
+        report.phase_seconds[phase] += end - start
+
+
+def run(
+    ticks: int,
+    seed: Optional[int] = None,
+    npc_count: Optional[int] = None,
+    map_width: Optional[int] = None,
+    map_height: Optional[int] = None,
+    trace_memory: bool = False,
+) -> SimulationReport:
+    """Generate a new game and run it for `ticks` ticks, returning how it performed."""
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    engine = setup_game.new_game(
+        "Headless",
+        "Player",
+        30,
+        map_width=map_width,
+        map_height=map_height,
+        npc_count=npc_count,
+        world_file=None,
+        seed=seed,
+    )
+    setup_seconds = time.perf_counter() - start
+
+    report = SimulationReport(ticks, sum(1 for actor in engine.game_map.actors) - 1)
+    report.setup_seconds = setup_seconds
+    start = time.perf_counter()
+    for _ in range(ticks):
+        tick(engine, report)
+    report.total_seconds = time.perf_counter() - start
+
+    if trace_memory:
+        report.peak_traced_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    if resource is not None:
+        # Kilobytes on Linux.
+        report.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return report
+
+
+def main() -> None:
+    debug_log.configure_from_environment()
+    parser = argparse.ArgumentParser(description="Run Nightfall without a window and report its speed.")
+    parser.add_argument("--ticks", type=int, default=1000, help="how many ticks to run (default 1000)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for world generation and the simulation")
+    parser.add_argument("--npcs", type=int, default=None, help="number of NPCs, instead of one per house")
+    parser.add_argument("--width", type=int, default=None, help="map width, instead of the configured width")
+    parser.add_argument("--height", type=int, default=None, help="map height, instead of the configured height")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="also trace Python allocations (slows the run down)"
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    if args.npcs is not None and args.npcs < 1:
+        parser.error("--npcs must be at least 1, since one of them is the murderer")
+
+    report = run(
+        args.ticks,
+        seed=args.seed,
+        npc_count=args.npcs,
+        map_width=args.width,
+        map_height=args.height,
+        trace_memory=args.trace_memory,
+    )
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
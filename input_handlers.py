@@ -1,5 +1,5 @@
 from __future__ import annotations
-import os
+import itertools
 from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
 import tcod
 import actions
@@ -13,6 +13,7 @@ from actions import (
 
 import color
 import exceptions
+import savefile
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -83,6 +84,11 @@ class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
     def on_render(self, console: tcod.Console) -> None:
         raise NotImplementedError()
 
+    @property
+    def is_busy(self) -> bool:
+        """True while work carries on in the background, so the screen is redrawn without any input."""
+        return False
+
     def ev_quit(self, event: tcod.event.Quit) -> Optional[Action]:
         raise SystemExit()
 
@@ -354,8 +360,8 @@ class MainGameEventHandler(EventHandler):
 class GameOverEventHandler(EventHandler):
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
-        if os.path.exists("savegame.sav"):
-            os.remove("savegame.sav")  # Deletes the active save file.
+        if self.engine.save_filename is not None:
+            savefile.delete(self.engine.save_filename)  # Deletes the active save file.
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def ev_quit(self, event: tcod.event.Quit) -> None:
@@ -399,8 +405,8 @@ class EndgameEventHandler(EventHandler):
         )
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
-        if os.path.exists("savegame.sav"):
-            os.remove("savegame.sav")  # Deletes the active save file.
+        if self.engine.save_filename is not None:
+            savefile.delete(self.engine.save_filename)  # Deletes the active save file.
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def ev_quit(self, event: tcod.event.Quit) -> None:
@@ -443,7 +449,7 @@ class HistoryViewer(EventHandler):
             1,
             log_console.width - 2,
             log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
+            list(itertools.islice(self.engine.message_log.messages, self.cursor + 1)),
         )
         log_console.blit(console, 3, 3)
 
@@ -2,19 +2,24 @@
 import traceback
 from typing import Dict
 import tcod
+from autosave import Autosaver
 import color
+import debug_log
 import exceptions
 import input_handlers
 import setup_game
 from game_settings import GameConfig
 
-def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
-    """If the current event handler has an active Engine then save it."""
-    if isinstance(handler, input_handlers.EventHandler):
-        handler.engine.save_as(filename)
-        print("Game saved.")
+logger = debug_log.get_logger(debug_log.SAVE)
+
+def save_game(handler: input_handlers.BaseEventHandler) -> None:
+    """If the current event handler has an active Engine then save it to its slot."""
+    if isinstance(handler, input_handlers.EventHandler) and handler.engine.save_filename is not None:
+        handler.engine.save_as(handler.engine.save_filename)
+        logger.info("Game saved.")
 
 def main() -> None:
+    debug_log.configure_from_environment()
     config: Dict = GameConfig.load_config_json()
     screen_width = config["window"]["width"]
     screen_height = config["window"]["height"]
@@ -23,6 +28,7 @@ def main() -> None:
     )
 
     handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
+    autosaver = Autosaver(config["game"]["autosave_seconds"])
     
     with tcod.context.new_terminal(
         screen_width,
@@ -33,29 +39,53 @@ def main() -> None:
     ) as context:
         root_console = tcod.Console(screen_width, screen_height, order="F")
         try:
+            render = True
             while True:
-                root_console.clear()
-                handler.on_render(console=root_console)
-                context.present(root_console)
+                # Only draw a new frame when something on screen may have changed.
+                if render:
+                    root_console.clear()
+                    handler.on_render(console=root_console)
+                    context.present(root_console)
+                render = False
 
+                # While the handler is busy, wake up every so often to draw its progress.
+                busy = handler.is_busy
+                if busy:
+                    render = True
                 try:
-                    for event in tcod.event.wait():
+                    for event in tcod.event.wait(timeout=0.1 if busy else None):
                         context.convert_event(event)
-                        handler = handler.handle_events(event)
+                        next_handler = handler.handle_events(event)
+                        # Mouse motion alone only matters if it moved the engine's mouse location.
+                        if next_handler is not handler or not isinstance(event, tcod.event.MouseMotion):
+                            render = True
+                        handler = next_handler
                 except Exception:  # Handle exceptions in game.
+                    render = True
                     traceback.print_exc()  # Print error to stderr.
                     # Then print the error to the message log.
                     if isinstance(handler, input_handlers.EventHandler):
                         handler.engine.message_log.add_message(
                             traceback.format_exc(), color.error
                         )
+                # A finished game is never saved, since quitting it deletes the save.
+                if (
+                    isinstance(handler, input_handlers.EventHandler)
+                    and not isinstance(
+                        handler, (input_handlers.GameOverEventHandler, input_handlers.EndgameEventHandler)
+                    )
+                    and handler.engine.player.is_alive
+                ):
+                    autosaver.update(handler.engine)
+                if isinstance(handler, input_handlers.EventHandler) and handler.engine.needs_render:
+                    render = True
         except exceptions.QuitWithoutSaving:
             raise
         except SystemExit:  # Save and quit.
-            save_game(handler, "savegame.sav")
+            save_game(handler)
             raise
         except BaseException:  # Save on any other unexpected exception.
-            save_game(handler, "savegame.sav")
+            save_game(handler)
             raise
 
 if __name__ == "__main__":
@@ -1,14 +1,43 @@
-from typing import Iterable, List, Reversible, Tuple
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Reversible, Tuple
 import textwrap
 import tcod
 import color
 
+# How many messages are kept in memory. Older messages are dropped, or spilled to disk.
+MESSAGE_LOG_CAPACITY = 1000
+# How many spilled messages are held before they are appended to the spill file.
+SPILL_BATCH_SIZE = 64
+
 class Message:
-    def __init__(self, text: str, fg: Tuple[int, int, int]):
-        self.plain_text = text
+    def __init__(self, text: str, fg: Tuple[int, int, int], args: Tuple[Any, ...] = ()):
+        # The text is kept as a template and only formatted with `args` once it is needed.
+        self.template = text
+        self.args = args
+        self._plain_text: Optional[str] = None
         self.fg = fg
+        # Wrapped lines of full_text, keyed by the width they were wrapped to.
+        self._wrapped: Dict[int, List[str]] = {}
         self.count = 1
 
+    @property
+    def count(self) -> int:
+        """How many times this message was stacked."""
+        return self._count
+
+    @count.setter
+    def count(self, count: int) -> None:
+        self._count = count
+        # The count is part of full_text, so any wrapped lines are now out of date.
+        self._wrapped.clear()
+
+    @property
+    def plain_text(self) -> str:
+        """The text of this message, formatted from its template the first time it is needed."""
+        if self._plain_text is None:
+            self._plain_text = self.template.format(*self.args) if self.args else self.template
+        return self._plain_text
+
     @property
     def full_text(self) -> str:
         """The full text of this message, including the count if necessary."""
@@ -16,22 +45,62 @@ class Message:
             return f"{self.plain_text} (x{self.count})"
         return self.plain_text
 
+    def wrap(self, width: int) -> List[str]:
+        """Return full_text wrapped to `width`, reusing the lines from the last time if possible."""
+        lines = self._wrapped.get(width)
+        if lines is None:
+            lines = self._wrapped[width] = list(MessageLog.wrap(self.full_text, width))
+        return lines
+
 class MessageLog:
-    def __init__(self) -> None:
-        self.messages: List[Message] = []
+    def __init__(
+        self, capacity: int = MESSAGE_LOG_CAPACITY, spill_path: Optional[str] = None
+    ) -> None:
+        """Keep the last `capacity` messages.
+        If `spill_path` is given, older messages are appended to that file instead
+        of being dropped.
+        """
+        self.messages: Deque[Message] = deque(maxlen=capacity)
+        self.spill_path = spill_path
+        # Messages pushed out of memory which are waiting to be written to the spill file.
+        self._spilled: List[str] = []
 
     def add_message(
-        self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True,
+        self,
+        text: str,
+        fg: Tuple[int, int, int] = color.white,
+        *,
+        stack: bool = True,
+        args: Tuple[Any, ...] = (),
     ) -> None:
         """Add a message to this log.
         `text` is the message text, `fg` is the text color.
+        If `args` are given then `text` is a str.format template, which is only
+        formatted with them once the message is displayed.
         If `stack` is True then the message can stack with a previous message
         of the same text.
         """
-        if stack and self.messages and text == self.messages[-1].plain_text:
+        if (
+            stack
+            and self.messages
+            and text == self.messages[-1].template
+            and args == self.messages[-1].args
+        ):
             self.messages[-1].count += 1
         else:
-            self.messages.append(Message(text, fg))
+            if len(self.messages) == self.messages.maxlen and self.spill_path:
+                self._spilled.append(self.messages[0].full_text)
+                if len(self._spilled) >= SPILL_BATCH_SIZE:
+                    self.flush_spill()
+            self.messages.append(Message(text, fg, args))
+
+    def flush_spill(self) -> None:
+        """Append any spilled messages to the spill file."""
+        if not self._spilled or not self.spill_path:
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.writelines(f"{text}\n" for text in self._spilled)
+        self._spilled.clear()
 
     def render(
         self, console: tcod.Console, x: int, y: int, width: int, height: int,
@@ -67,7 +136,7 @@ class MessageLog:
         y_offset = height - 1
 
         for message in reversed(messages):
-             for line in reversed(list(cls.wrap(message.full_text, width))):
+             for line in reversed(message.wrap(width)):
                 console.print(x=x, y=y + y_offset, string=line, fg=message.fg)
                 y_offset -= 1
                 if y_offset < 0:
@@ -1,4 +1,7 @@
-import random
+import rng
+import debug_log
+
+logger = debug_log.get_logger(debug_log.NAMEGEN)
 
 class NameGenerator():
     afab_names = []
@@ -7,7 +10,7 @@ class NameGenerator():
     initialized = False
     
     def load_names():
-        print("Loading names for NameGenerator...")
+        logger.debug("Loading names for NameGenerator...")
         total_names = 0
     
         afab_names = open('gen_sources/names/first/afab.txt', 'r')
@@ -32,17 +35,17 @@ class NameGenerator():
 
         total_names += len(last_names)
         NameGenerator.initialized = True
-        print(f"Namegen loaded {total_names} names")
+        logger.debug("Namegen loaded %d names", total_names)
     
     def get_first_name(afab: bool = False):
         if NameGenerator.initialized == False:
             NameGenerator.load_names()
         if afab:
-            return random.choice(NameGenerator.afab_names)
+            return rng.stream(rng.NAMES).choice(NameGenerator.afab_names)
         else:
-            return random.choice(NameGenerator.amab_names)
+            return rng.stream(rng.NAMES).choice(NameGenerator.amab_names)
 
     def get_last_name():
         if NameGenerator.initialized == False:
             NameGenerator.load_names()
-        return random.choice(NameGenerator.last_names)
\ No newline at end of file
+        return rng.stream(rng.NAMES).choice(NameGenerator.last_names)
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""Encoding the game state as arrays of numbers, for agents to observe."""
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import numpy as np  # type: ignore
+from entity import Actor, Item
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from entity import Entity
+    from game_map import GameMap
+
+# The layers of an observation, in order.
+CHANNELS = (
+    "walkable",
+    "transparent",
+    "visible",
+    "explored",
+    "actors",  # How many living actors stand on the tile.
+    "items",  # How many items lie on the tile, not counting doors.
+    "doors",  # 0 for no door, 1 for an open door and 2 for a closed door.
+    "evil",  # How many evil actors stand on the tile.
+    "hp",  # The remaining HP of the actors on the tile, where 255 is full health.
+)
+
+DOOR_OPEN = 1
+DOOR_CLOSED = 2
+
+
+class EntityGrids:
+    """
+    Per tile counts of what stands on a map, kept up to date by the GameMap as entities change.
+
+    Each entity's contribution to the grids is remembered, so that it can be
+    taken back out when the entity moves or changes, without rescanning the map.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.actors = np.zeros((width, height), dtype=np.int16, order="F")
+        self.items = np.zeros((width, height), dtype=np.int16, order="F")
+        self.doors = np.zeros((width, height), dtype=np.int16, order="F")
+        self.evil = np.zeros((width, height), dtype=np.int16, order="F")
+        self.hp = np.zeros((width, height), dtype=np.int16, order="F")
+        # (x, y, actors, items, doors, evil, hp) added for each entity.
+        self._contributions: Dict[Entity, Tuple[int, int, int, int, int, int, int]] = {}
+
+    def update(self, entity: Entity) -> None:
+        """Re-add an entity after it moved, or its state changed."""
+        self.remove(entity)
+        contribution = self._contribution(entity)
+        if contribution is not None:
+            self._apply(contribution, 1)
+            self._contributions[entity] = contribution
+
+    def remove(self, entity: Entity) -> None:
+        contribution = self._contributions.pop(entity, None)
+        if contribution is not None:
+            self._apply(contribution, -1)
+
+    def move(self, entities: Sequence[Entity], xs: np.ndarray, ys: np.ndarray) -> None:
+        """Move the contributions of many entities at once, after they moved to xs and ys."""
+        moved: List[int] = []
+        old: List[Tuple[int, int, int, int, int, int, int]] = []
+        for index, (entity, x, y) in enumerate(zip(entities, xs.tolist(), ys.tolist())):
+            contribution = self._contributions.get(entity)
+            if contribution is not None:
+                moved.append(index)
+                old.append(contribution)
+                self._contributions[entity] = (x, y, *contribution[2:])
+        if not moved:
+            return
+        old_x, old_y, *values = np.array(old, dtype=np.intp).T
+        new_x, new_y = xs[moved], ys[moved]
+        for grid, value in zip((self.actors, self.items, self.doors, self.evil, self.hp), values):
+            # np.add.at, since several entities may share a tile.
+            np.subtract.at(grid, (old_x, old_y), value)
+            np.add.at(grid, (new_x, new_y), value)
+
+    def _apply(self, contribution: Tuple[int, int, int, int, int, int, int], sign: int) -> None:
+        x, y, actors, items, doors, evil, hp = contribution
+        self.actors[x, y] += sign * actors
+        self.items[x, y] += sign * items
+        self.doors[x, y] += sign * doors
+        self.evil[x, y] += sign * evil
+        self.hp[x, y] += sign * hp
+
+    @staticmethod
+    def _contribution(entity: Entity) -> Optional[Tuple[int, int, int, int, int, int, int]]:
+        if isinstance(entity, Actor):
+            if not entity.is_alive:
+                return None
+            fighter = entity.fighter
+            hp = round(255 * fighter.hp / fighter.max_hp) if fighter.max_hp else 0
+            return entity.x, entity.y, 1, 0, 0, int(bool(entity.evil)), hp
+        if isinstance(entity, Item):
+            if entity.name == "Door":
+                door = DOOR_CLOSED if entity.blocks_movement else DOOR_OPEN
+                return entity.x, entity.y, 0, 0, door, 0, 0
+            return entity.x, entity.y, 0, 1, 0, 0, 0
+        return None
+
+
+class ObservationEncoder:
+    """
+    Writes the CHANNELS of the current map into a caller's uint8 array of shape
+    (channels, width, height), without allocating anything each step.
+
+    With a `crop_radius`, only the square of tiles within that many tiles of the
+    player is written, with the player in the center. Tiles past the edge of
+    the map are all zeros.
+    """
+
+    def __init__(self, crop_radius: Optional[int] = None):
+        self.crop_radius = crop_radius
+
+    def shape(self, map_width: int, map_height: int) -> Tuple[int, int, int]:
+        """The shape of the observations of a map of this size."""
+        if self.crop_radius is None:
+            return len(CHANNELS), map_width, map_height
+        side = 2 * self.crop_radius + 1
+        return len(CHANNELS), side, side
+
+    @staticmethod
+    def sources(game_map: GameMap) -> Tuple[np.ndarray, ...]:
+        """The arrays each channel is copied from, in CHANNELS order."""
+        grids = game_map.entity_grids
+        return (
+            game_map.tiles["walkable"],
+            game_map.tiles["transparent"],
+            game_map.visible,
+            game_map.explored,
+            grids.actors,
+            grids.items,
+            grids.doors,
+            grids.evil,
+            grids.hp,
+        )
+
+    def encode(self, engine: Engine, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Write the current observation into `out`, or a new array if it is not given."""
+        game_map = engine.game_map
+        if out is None:
+            out = np.empty(self.shape(game_map.width, game_map.height), dtype=np.uint8)
+
+        if self.crop_radius is None:
+            source_window = destination_window = (slice(None), slice(None))
+        else:
+            radius = self.crop_radius
+            left, top = engine.player.x - radius, engine.player.y - radius
+            source_window = (
+                slice(max(0, left), min(game_map.width, left + 2 * radius + 1)),
+                slice(max(0, top), min(game_map.height, top + 2 * radius + 1)),
+            )
+            destination_window = (
+                slice(source_window[0].start - left, source_window[0].stop - left),
+                slice(source_window[1].start - top, source_window[1].stop - top),
+            )
+            if (source_window[0].stop - source_window[0].start < out.shape[1]
+                    or source_window[1].stop - source_window[1].start < out.shape[2]):
+                # Part of the crop is off the map.
+                out.fill(0)
+
+        for channel, source in enumerate(self.sources(game_map)):
+            destination = out[channel][destination_window]
+            if source.dtype == bool:
+                np.copyto(destination, source[source_window])
+            else:
+                # Counts can go past what a byte holds when many entities share a tile.
+                np.minimum(source[source_window], 255, out=destination, casting="unsafe")
+        return out
@@ -0,0 +1,457 @@
+"""Pathfinding fields shared between many actors."""
+from __future__ import annotations
+import heapq
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import numpy as np  # type: ignore
+import tcod
+
+if TYPE_CHECKING:
+    from building import Building
+    from entity import Actor
+    from game_map import GameMap
+
+# Neighbouring offsets. Cardinal directions come first so ties prefer straight moves.
+DIRECTIONS = (
+    (0, -1),  # North
+    (0, 1),  # South
+    (-1, 0),  # West
+    (1, 0),  # East
+    (-1, -1),  # Northwest
+    (1, -1),  # Northeast
+    (-1, 1),  # Southwest
+    (1, 1),  # Southeast
+)
+
+
+# Distance value of tiles which can not reach the root of a distance map.
+UNREACHABLE = np.iinfo(np.int32).max
+# How far around its building a flow field reaches.
+FLOW_FIELD_MARGIN = 16
+# How far around its root, and the actors chasing it, a per-turn distance map reaches.
+DISTANCE_MAP_MARGIN = 8
+
+
+def compute_distance_map(cost: np.ndarray, root: Tuple[int, int]) -> np.ndarray:
+    """Return a Dijkstra distance map from every tile to `root` over `cost`.
+
+    Uses the same edge costs as BaseAI.get_path_to.
+    """
+    distance = tcod.path.maxarray(cost.shape, dtype=np.int32, order="F")
+    distance[root] = 0
+    tcod.path.dijkstra2d(distance, cost, 2, 3, out=distance)
+    return distance
+
+
+def compute_path(
+    game_map: GameMap, start: Tuple[int, int], dest: Tuple[int, int]
+) -> List[Tuple[int, int]]:
+    """Compute and return a path from `start` to `dest`, excluding `start`.
+
+    If there is no valid path then returns an empty list.
+    """
+    # The map keeps its cost array up to date as entities move, so it can
+    # be used for the graph directly.
+    graph = tcod.path.SimpleGraph(cost=game_map.path_cost, cardinal=2, diagonal=3)
+    pathfinder = tcod.path.Pathfinder(graph)
+
+    pathfinder.add_root(start)  # Start position.
+
+    # Compute the path to the destination and remove the starting point.
+    path: List[List[int]] = pathfinder.path_to(dest)[1:].tolist()
+    # Convert from List[List[int]] to List[Tuple[int, int]].
+    return [(index[0], index[1]) for index in path]
+
+
+def descend(
+    distance: np.ndarray,
+    game_map: GameMap,
+    x: int,
+    y: int,
+    origin: Tuple[int, int] = (0, 0),
+) -> Optional[Tuple[int, int]]:
+    """Return the neighbour of (x, y) which is closest to the distance map's root.
+
+    `origin` is the map tile at index (0, 0) of `distance`, for distance maps
+    covering only part of the map. (x, y) must lie inside the distance map.
+
+    Free tiles are preferred over tiles occupied by a blocking entity so that
+    crowds spread out. A blocked tile is only returned when no free tile gets
+    closer, so that closed doors on the way are still bumped open.
+    Returns None if no neighbour is closer than (x, y) itself.
+    """
+    cost = game_map.path_cost
+    origin_x, origin_y = origin
+    width, height = distance.shape
+    best_free = best_blocked = None
+    best_free_distance = best_blocked_distance = distance[x - origin_x, y - origin_y]
+    for dx, dy in DIRECTIONS:
+        next_x, next_y = x + dx, y + dy
+        local_x, local_y = next_x - origin_x, next_y - origin_y
+        if not (0 <= local_x < width and 0 <= local_y < height):
+            continue
+        if not cost[next_x, next_y]:
+            continue
+        next_distance = distance[local_x, local_y]
+        if cost[next_x, next_y] == 1:
+            if next_distance < best_free_distance:
+                best_free = next_x, next_y
+                best_free_distance = next_distance
+        elif next_distance < best_blocked_distance:
+            best_blocked = next_x, next_y
+            best_blocked_distance = next_distance
+    return best_free or best_blocked
+
+
+class DistanceMaps:
+    """
+    A per-turn cache of distance maps rooted at the tiles actors are chasing.
+
+    Every actor heading for the same tile this turn shares one Dijkstra field
+    and reads its next step from it, instead of running its own pathfinder.
+
+    A field only covers a window around its root and the actors chasing it,
+    DISTANCE_MAP_MARGIN tiles to each side, since chases are mostly short and a
+    whole-map field costs far more than a single path. The window grows when an
+    actor outside it asks for a step. Actors whose way round lies outside the
+    window fall back on their own path.
+    """
+
+    def __init__(self) -> None:
+        # Each root's field, with the window of map tiles (x0, y0, x1, y1) it covers.
+        self._fields: Dict[Tuple[int, int], Tuple[np.ndarray, Tuple[int, int, int, int]]] = {}
+
+    def clear(self) -> None:
+        """Forget every field. Called at the start of each turn."""
+        self._fields.clear()
+
+    def get(
+        self, game_map: GameMap, x: int, y: int, near_x: int, near_y: int
+    ) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Return the distance map rooted at (x, y) covering (near_x, near_y), and its origin tile.
+
+        The map is computed on first use this turn, or again over a larger window
+        when (near_x, near_y) lies outside the one it was computed for.
+        """
+        # The tiles the window must cover, as inclusive bounds.
+        left, top, right, bottom = min(x, near_x), min(y, near_y), max(x, near_x), max(y, near_y)
+        entry = self._fields.get((x, y))
+        if entry is not None:
+            field, (x0, y0, x1, y1) = entry
+            if x0 <= near_x < x1 and y0 <= near_y < y1:
+                return field, (x0, y0)
+            # Grow the window to cover the old one too, for the actors already using it.
+            left, top, right, bottom = min(left, x0), min(top, y0), max(right, x1 - 1), max(bottom, y1 - 1)
+        x0 = max(0, left - DISTANCE_MAP_MARGIN)
+        y0 = max(0, top - DISTANCE_MAP_MARGIN)
+        x1 = min(game_map.width, right + DISTANCE_MAP_MARGIN + 1)
+        y1 = min(game_map.height, bottom + DISTANCE_MAP_MARGIN + 1)
+        field = compute_distance_map(game_map.path_cost[x0:x1, y0:y1], (x - x0, y - y0))
+        self._fields[(x, y)] = field, (x0, y0, x1, y1)
+        return field, (x0, y0)
+
+    def next_step(self, entity: Actor, dest_x: int, dest_y: int) -> Optional[Tuple[int, int]]:
+        """Return the tile `entity` should step onto to approach (dest_x, dest_y).
+
+        Returns None if the entity can not get any closer this turn.
+        """
+        game_map = entity.gamemap
+        field, origin = self.get(game_map, dest_x, dest_y, entity.x, entity.y)
+        step = descend(field, game_map, entity.x, entity.y, origin)
+        if step is None:
+            # The way round may leave the window, so look over the whole map.
+            path = compute_path(game_map, (entity.x, entity.y), (dest_x, dest_y))
+            if path:
+                step = path[0]
+        return step
+
+
+class FlowFields:
+    """
+    Distance maps leading to each building on a GameMap, used to send residents home.
+
+    Building layouts never change after generation, so each field is computed
+    once over the walkable tiles and reused until the map's walkability changes.
+    Entities are ignored; closed doors are bumped open on the way.
+
+    A field only covers the neighbourhood of its building, FLOW_FIELD_MARGIN
+    tiles to each side, so that large towns do not hold a whole-map array per
+    building. Residents further away than that find their own way back first.
+    """
+
+    def __init__(self, game_map: GameMap) -> None:
+        self.game_map = game_map
+        # Each building's field, with the map tile at index (0, 0) of the field.
+        self._fields: Dict[Building, Tuple[np.ndarray, Tuple[int, int]]] = {}
+        self._walkable_version = game_map.walkable_version
+
+    def precompute(self) -> None:
+        """Compute the field of every building on the map."""
+        for building in self.game_map.buildings:
+            self.get(building)
+
+    def get(self, building: Building) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Return the distance map rooted at the center of `building`, and its origin tile."""
+        if self._walkable_version != self.game_map.walkable_version:
+            self._fields.clear()
+            self._walkable_version = self.game_map.walkable_version
+        entry = self._fields.get(building)
+        if entry is None:
+            x0 = max(0, building.x - FLOW_FIELD_MARGIN)
+            y0 = max(0, building.y - FLOW_FIELD_MARGIN)
+            x1 = min(self.game_map.width, building.x2 + FLOW_FIELD_MARGIN)
+            y1 = min(self.game_map.height, building.y2 + FLOW_FIELD_MARGIN)
+            cost = np.array(
+                self.game_map.tiles["walkable"][x0:x1, y0:y1], dtype=np.int8, order="F"
+            )
+            center_x, center_y = building.center
+            entry = compute_distance_map(cost, (center_x - x0, center_y - y0)), (x0, y0)
+            self._fields[building] = entry
+        return entry
+
+    def covers(self, building: Building, x: int, y: int) -> bool:
+        """Return True if the field of `building` leads home from (x, y)."""
+        field, (x0, y0) = self.get(building)
+        width, height = field.shape
+        return (
+            0 <= x - x0 < width
+            and 0 <= y - y0 < height
+            and field[x - x0, y - y0] != UNREACHABLE
+        )
+
+    def next_step(self, entity: Actor, building: Building) -> Optional[Tuple[int, int]]:
+        """Return the tile `entity` should step onto to get to `building`.
+
+        Returns None once the entity is home, or if it can not get any closer.
+        Only valid where covers() is True.
+        """
+        field, origin = self.get(building)
+        return descend(field, self.game_map, entity.x, entity.y, origin)
+
+
+# Cluster size of a PathHierarchy when a map does not say otherwise.
+DEFAULT_CLUSTER_SIZE = 16
+# Border stretches at least this long get an entrance at each end instead of one in the middle.
+LONG_ENTRANCE = 6
+
+
+def octile_distance(start: Tuple[int, int], dest: Tuple[int, int]) -> int:
+    """Return the cheapest possible cost between two tiles, using the edge costs of compute_path."""
+    dx = abs(start[0] - dest[0])
+    dy = abs(start[1] - dest[1])
+    return 2 * max(dx, dy) + min(dx, dy)
+
+
+def compute_local_path(
+    game_map: GameMap, start: Tuple[int, int], dest: Tuple[int, int], margin: int = 4
+) -> List[Tuple[int, int]]:
+    """Compute a path from `start` to `dest`, searching only the box around them.
+
+    Falls back to compute_path over the whole map if the box has no way through.
+    """
+    x0 = max(0, min(start[0], dest[0]) - margin)
+    y0 = max(0, min(start[1], dest[1]) - margin)
+    x1 = min(game_map.width, max(start[0], dest[0]) + margin + 1)
+    y1 = min(game_map.height, max(start[1], dest[1]) + margin + 1)
+    cost = np.array(game_map.path_cost[x0:x1, y0:y1], order="F")
+    graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
+    pathfinder = tcod.path.Pathfinder(graph)
+    pathfinder.add_root((start[0] - x0, start[1] - y0))
+    path: List[List[int]] = pathfinder.path_to((dest[0] - x0, dest[1] - y0))[1:].tolist()
+    if not path and start != dest:
+        return compute_path(game_map, start, dest)
+    return [(index[0] + x0, index[1] + y0) for index in path]
+
+
+class PathHierarchy:
+    """
+    A two level pathfinder for long trips across a GameMap.
+
+    The map is cut into square clusters. On town maps each cluster is one plot
+    and the street beside it. Each walkable stretch of a cluster border gets
+    entrance nodes, and the walking distance between every pair of entrances
+    in a cluster is worked out once over the walkable tiles. A long trip is
+    planned over this small graph of entrances, and the caller turns it into
+    tiles one short leg at a time with compute_local_path.
+    """
+
+    def __init__(
+        self,
+        game_map: GameMap,
+        cluster_size: int = DEFAULT_CLUSTER_SIZE,
+        origin: Tuple[int, int] = (0, 0),
+    ) -> None:
+        self.game_map = game_map
+        self.cluster_size = cluster_size
+        self.origin = origin
+        self._edges: Dict[Tuple[int, int], Dict[Tuple[int, int], int]] = {}
+        self._cluster_nodes: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        self._walkable_version: Optional[int] = None
+
+    def cluster_of(self, x: int, y: int) -> Tuple[int, int]:
+        """Return the cluster which contains the tile (x, y)."""
+        return (
+            (x - self.origin[0]) // self.cluster_size,
+            (y - self.origin[1]) // self.cluster_size,
+        )
+
+    def cluster_bounds(self, cluster: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """Return the (x0, y0, x1, y1) tile bounds of `cluster`, clipped to the map."""
+        x0 = self.origin[0] + cluster[0] * self.cluster_size
+        y0 = self.origin[1] + cluster[1] * self.cluster_size
+        return (
+            max(0, x0),
+            max(0, y0),
+            min(self.game_map.width, x0 + self.cluster_size),
+            min(self.game_map.height, y0 + self.cluster_size),
+        )
+
+    def precompute(self) -> None:
+        """Build the entrance graph, if the map's walkability has changed since it was built."""
+        if self._walkable_version == self.game_map.walkable_version:
+            return
+        self._edges = {}
+        self._cluster_nodes = {}
+        walkable = self.game_map.tiles["walkable"]
+        width, height = self.game_map.width, self.game_map.height
+
+        # Vertical borders, between a cluster and the one to its east.
+        for border_x in range(self.origin[0] % self.cluster_size, width, self.cluster_size):
+            if border_x <= 0:
+                continue
+            crossable = walkable[border_x - 1, :] & walkable[border_x, :]
+            for y in self._entrance_offsets(crossable, self.origin[1]):
+                self._add_entrance((border_x - 1, y), (border_x, y))
+        # Horizontal borders, between a cluster and the one to its south.
+        for border_y in range(self.origin[1] % self.cluster_size, height, self.cluster_size):
+            if border_y <= 0:
+                continue
+            crossable = walkable[:, border_y - 1] & walkable[:, border_y]
+            for x in self._entrance_offsets(crossable, self.origin[0]):
+                self._add_entrance((x, border_y - 1), (x, border_y))
+
+        # Connect the entrances inside every cluster.
+        for cluster, nodes in self._cluster_nodes.items():
+            for node, distances in zip(nodes, self._cluster_distances(cluster, nodes)):
+                for other, distance in distances.items():
+                    if other != node:
+                        self._link(node, other, distance)
+
+        self._walkable_version = self.game_map.walkable_version
+
+    def _entrance_offsets(self, crossable: np.ndarray, origin: int) -> List[int]:
+        """Return where entrances go along a border, given which tiles can cross it.
+
+        The border is split where it meets other clusters, so that every
+        stretch of it lies between exactly two clusters.
+        """
+        offsets = []
+        first_split = origin % self.cluster_size
+        splits = [0, *range(first_split, len(crossable), self.cluster_size), len(crossable)]
+        for segment_start, segment_end in zip(splits, splits[1:]):
+            if segment_start >= segment_end:
+                continue
+            segment = crossable[segment_start:segment_end]
+            padded = np.concatenate(([False], segment, [False]))
+            changes = np.flatnonzero(padded[1:] != padded[:-1])
+            for run_start, run_end in zip(changes[::2], changes[1::2]):
+                run_start += segment_start
+                run_end += segment_start
+                if run_end - run_start >= LONG_ENTRANCE:
+                    offsets.extend((int(run_start), int(run_end - 1)))
+                else:
+                    offsets.append(int(run_start + run_end - 1) // 2)
+        return offsets
+
+    def _add_entrance(self, a: Tuple[int, int], b: Tuple[int, int]) -> None:
+        for node in (a, b):
+            if node not in self._edges:
+                self._edges[node] = {}
+                self._cluster_nodes.setdefault(self.cluster_of(*node), []).append(node)
+        self._link(a, b, 2)
+        self._link(b, a, 2)
+
+    def _link(self, a: Tuple[int, int], b: Tuple[int, int], cost: int) -> None:
+        edges = self._edges[a]
+        if cost < edges.get(b, cost + 1):
+            edges[b] = cost
+
+    def _cluster_distances(
+        self, cluster: Tuple[int, int], roots: List[Tuple[int, int]]
+    ) -> List[Dict[Tuple[int, int], int]]:
+        """For each root, return the walking distance to every entrance of `cluster` it can reach."""
+        x0, y0, x1, y1 = self.cluster_bounds(cluster)
+        cost = np.array(self.game_map.tiles["walkable"][x0:x1, y0:y1], dtype=np.int8, order="F")
+        nodes = self._cluster_nodes.get(cluster, [])
+        results = []
+        for root_x, root_y in roots:
+            distance = compute_distance_map(cost, (root_x - x0, root_y - y0))
+            reachable = {}
+            for node_x, node_y in nodes:
+                node_distance = int(distance[node_x - x0, node_y - y0])
+                if node_distance != UNREACHABLE:
+                    reachable[(node_x, node_y)] = node_distance
+            results.append(reachable)
+        return results
+
+    def plan(
+        self, start: Tuple[int, int], dest: Tuple[int, int]
+    ) -> Optional[List[Tuple[int, int]]]:
+        """Return the waypoints of a trip from `start` to `dest`, ending with `dest`.
+
+        Consecutive waypoints are at most a cluster apart. Trips within one
+        cluster are a single waypoint. Returns None if `dest` can not be reached.
+        """
+        start_cluster = self.cluster_of(*start)
+        dest_cluster = self.cluster_of(*dest)
+        if start_cluster == dest_cluster:
+            return [dest]
+
+        self.precompute()
+        start_costs = self._cluster_distances(start_cluster, [start])[0]
+        dest_costs = self._cluster_distances(dest_cluster, [dest])[0]
+        return self._search(start, dest, start_costs, dest_costs)
+
+    def _search(
+        self,
+        start: Tuple[int, int],
+        dest: Tuple[int, int],
+        start_costs: Dict[Tuple[int, int], int],
+        dest_costs: Dict[Tuple[int, int], int],
+    ) -> Optional[List[Tuple[int, int]]]:
+        """A* over the entrance graph, with `start` and `dest` joined to their own clusters."""
+        best_cost: Dict[Tuple[int, int], int] = {}
+        came_from: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {}
+        frontier: List[Tuple[int, int, Tuple[int, int]]] = []
+        for node, cost in start_costs.items():
+            best_cost[node] = cost
+            came_from[node] = None
+            heapq.heappush(frontier, (cost + octile_distance(node, dest), cost, node))
+
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == dest:
+                break
+            if cost > best_cost[node]:
+                continue
+            neighbours = list(self._edges.get(node, {}).items())
+            if node in dest_costs:
+                neighbours.append((dest, dest_costs[node]))
+            for neighbour, step_cost in neighbours:
+                new_cost = cost + step_cost
+                if new_cost < best_cost.get(neighbour, new_cost + 1):
+                    best_cost[neighbour] = new_cost
+                    came_from[neighbour] = node
+                    heapq.heappush(
+                        frontier,
+                        (new_cost + octile_distance(neighbour, dest), new_cost, neighbour),
+                    )
+        else:
+            return None
+
+        waypoints = [dest]
+        node = came_from[dest]
+        while node is not None:
+            waypoints.append(node)
+            node = came_from[node]
+        waypoints.reverse()
+        return waypoints
@@ -0,0 +1,152 @@
+"""What actors other than the player can see."""
+from __future__ import annotations
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+import numpy as np  # type: ignore
+from tcod.map import compute_fov
+from tcod import FOV_DIAMOND
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from entity import Actor
+    from game_map import GameMap
+
+# Batches smaller than this are computed on the calling thread.
+MIN_THREADED_BATCH = 32
+
+# compute_fov runs in C without the GIL, so a thread pool spreads a batch over every core.
+# It is shared and created on first use so that it never ends up in a save file.
+FOV_WORKERS = os.cpu_count() or 1
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=FOV_WORKERS)
+    return _executor
+
+
+class FieldOfView:
+    """The tiles one observer could see, within the window its radius reaches."""
+
+    def __init__(self, key: Tuple[int, int, int, int], window: Tuple[slice, slice], visible: np.ndarray):
+        # (x, y, radius, transparent_version) this was computed for.
+        self.key = key
+        self.window = window
+        self.visible = visible
+
+    def can_see(self, x: int, y: int) -> bool:
+        x_window, y_window = self.window
+        if not (x_window.start <= x < x_window.stop and y_window.start <= y < y_window.stop):
+            return False
+        return bool(self.visible[x - x_window.start, y - y_window.start])
+
+
+def compute_window_fov(
+    transparent: np.ndarray, x: int, y: int, radius: int
+) -> Tuple[Tuple[slice, slice], np.ndarray]:
+    """Compute the FOV from (x, y) over only the square of tiles `radius` can reach.
+
+    Returns the window as a pair of slices into `transparent`, and the visible tiles inside it.
+    """
+    width, height = transparent.shape
+    window = (
+        slice(max(0, x - radius), min(width, x + radius + 1)),
+        slice(max(0, y - radius), min(height, y + radius + 1)),
+    )
+    visible = compute_fov(
+        transparent[window],
+        (x - window[0].start, y - window[1].start),
+        radius=radius,
+        algorithm=FOV_DIAMOND,
+    )
+    return window, visible
+
+
+class Perception:
+    """
+    Computes and caches what actors can see.
+
+    An observer's FOV is only recomputed once it moves, its sight radius changes
+    or the map's transparency changes. Many observers can be computed at once
+    with observe(), which spreads large batches over a thread pool.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._fovs: Dict[Actor, FieldOfView] = {}
+        self._game_map: Optional[GameMap] = None
+
+    def sight_radius(self, observer: Actor) -> int:
+        """How far `observer` can see right now. Nobody sees further than the player at night."""
+        return max(1, min(observer.base_fov, int(self.engine.current_fov_radius)))
+
+    def _key(self, observer: Actor) -> Tuple[int, int, int, int]:
+        return (
+            observer.x,
+            observer.y,
+            self.sight_radius(observer),
+            self.engine.game_map.transparent_version,
+        )
+
+    def observe(self, observers: Iterable[Actor]) -> None:
+        """Bring the FOV of every observer up to date, as a single batch."""
+        game_map = self.engine.game_map
+        if game_map is not self._game_map:
+            self._fovs.clear()
+            self._game_map = game_map
+
+        stale = []
+        for observer in observers:
+            key = self._key(observer)
+            fov = self._fovs.get(observer)
+            if fov is None or fov.key != key:
+                stale.append((observer, key))
+        if not stale:
+            return
+
+        transparent = game_map.tiles["transparent"]
+
+        def compute(batch: List[Tuple[Actor, Tuple[int, int, int, int]]]) -> List[FieldOfView]:
+            return [
+                FieldOfView(key, *compute_window_fov(transparent, key[0], key[1], key[2]))
+                for _, key in batch
+            ]
+
+        if len(stale) < MIN_THREADED_BATCH:
+            results = compute(stale)
+        else:
+            # One chunk per worker.
+            chunk_size = -(-len(stale) // FOV_WORKERS)  # Round up.
+            chunks = [stale[i : i + chunk_size] for i in range(0, len(stale), chunk_size)]
+            results = [fov for chunk in _get_executor().map(compute, chunks) for fov in chunk]
+
+        for (observer, _), fov in zip(stale, results):
+            self._fovs[observer] = fov
+
+    def can_see(self, observer: Actor, x: int, y: int) -> bool:
+        """Return True if `observer` can currently see the tile (x, y)."""
+        self.observe((observer,))
+        return self._fovs[observer].can_see(x, y)
+
+    def observers_of(self, x: int, y: int, exclude: Iterable[Actor] = ()) -> List[Actor]:
+        """Return the living actors who can currently see the tile (x, y).
+
+        Only actors close enough to possibly see the tile have their FOV computed.
+        """
+        excluded = set(exclude)
+        candidates = [
+            actor
+            for actor in self.engine.game_map.actors
+            if actor not in excluded
+            and max(abs(actor.x - x), abs(actor.y - y)) <= self.sight_radius(actor)
+        ]
+        self.observe(candidates)
+        self._forget_dead()
+        return [actor for actor in candidates if self._fovs[actor].can_see(x, y)]
+
+    def _forget_dead(self) -> None:
+        for actor in [actor for actor in self._fovs if not actor.is_alive]:
+            del self._fovs[actor]
@@ -1,7 +1,8 @@
 from __future__ import annotations
 import copy
 import pdb
-import random
+import debug_log
+import rng
 from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING, Optional
 import tcod
 import entity_factories
@@ -10,12 +11,15 @@ import tile_types
 from entity import Actor
 from building import Building, BuildingType
 from generators.equipment import generate_pants, generate_weapon
+from pathfinding import PathHierarchy
 from plot import Plot
 from components.ai import EvilNPC
 if TYPE_CHECKING:
    from engine import Engine
    from entity import Entity, Actor
 
+logger = debug_log.get_logger(debug_log.PROCGEN)
+
 max_items_by_floor = [
     (1, 1),
     (4, 2),
@@ -137,7 +141,7 @@ def get_entities_at_random(
     entities = list(entity_weighted_chances.keys())
     entity_weighted_chance_values = list(entity_weighted_chances.values())
 
-    chosen_entities = random.choices(
+    chosen_entities = rng.stream(rng.PROCGEN).choices(
         entities, weights=entity_weighted_chance_values, k=number_of_entities
     )
 
@@ -191,10 +195,11 @@ class Area:
         return center_x, center_y
 
 def place_entities(room: RectangularRoom, dungeon: GameMap, floor_number: int,) -> None:
-    number_of_monsters = random.randint(
+    procgen_rng = dungeon.engine.rng.stream(rng.PROCGEN)
+    number_of_monsters = procgen_rng.randint(
         0, get_max_value_for_floor(max_monsters_by_floor, floor_number)
     )
-    number_of_items = random.randint(
+    number_of_items = procgen_rng.randint(
         0, get_max_value_for_floor(max_items_by_floor, floor_number)
     )
 
@@ -206,27 +211,61 @@ def place_entities(room: RectangularRoom, dungeon: GameMap, floor_number: int,)
     )
     # for entity in monsters + items:
     for entity in items:
-            x = random.randint(room.x1 + 1, room.x2 - 1)
-            y = random.randint(room.y1 + 1, room.y2 - 1)
+            x = procgen_rng.randint(room.x1 + 1, room.x2 - 1)
+            y = procgen_rng.randint(room.y1 + 1, room.y2 - 1)
 
-            if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
+            if not dungeon.get_entities_at_location(x, y):
                 entity.spawn(dungeon, x, y)
 
-def place_actors(area: Area) -> List[Actor]:
+def find_spawn_location(game_map: GameMap, x: int, y: int) -> Optional[Tuple[int, int]]:
+    """Return the free walkable tile nearest x and y, or None if the map has none.
+
+    Tiles are tried in rings around x and y, so a resident spawned at a house's
+    center lands inside the house, or just outside it once the house is full.
+    """
+    for radius in range(max(game_map.width, game_map.height)):
+        for dx in range(-radius, radius + 1):
+            for dy in range(-radius, radius + 1):
+                if max(abs(dx), abs(dy)) != radius:
+                    continue  # Only the edge of this ring, the inside was tried already.
+                spawn_x, spawn_y = x + dx, y + dy
+                if (
+                    game_map.in_bounds(spawn_x, spawn_y)
+                    and game_map.tiles["walkable"][spawn_x, spawn_y]
+                    and game_map.get_blocking_entity_at_location(spawn_x, spawn_y) is None
+                ):
+                    return spawn_x, spawn_y
+    return None
+
+def place_actors(area: Area, npc_count: Optional[int] = None) -> List[Actor]:
+    """Spawn the town's residents, one per house unless `npc_count` says otherwise.
+
+    With `npc_count`, residents are shared out between the houses in turn.
+    """
+    procgen_rng = area._game_map.engine.rng.stream(rng.PROCGEN)
     # get houses
+    houses = [
+        plot.building for plot in area.plots
+        if plot.building.building_type == BuildingType.HOUSE
+    ]
+    if npc_count is None:
+        npc_count = len(houses)
     actors = []
-    for plot in area.plots:
-        building = plot.building
-        if building.building_type == BuildingType.HOUSE:
-            # Spawn entity here
-            x,y = building.center
-            actor: Actor = entity_factories.create_person().spawn(area._game_map, x, y, [generate_pants()])
-            actor.owned_building = building
-            actors.append(actor)
+    for i in range(npc_count if houses else 0):
+        building = houses[i % len(houses)]
+        # Spawn each resident on a tile of their own, so that no two actors share one.
+        location = find_spawn_location(area._game_map, *building.center)
+        if location is None:
+            logger.warning("No free tile left for resident %d of %d", i + 1, npc_count)
+            break
+        x, y = location
+        actor: Actor = entity_factories.create_person().spawn(area._game_map, x, y, [generate_pants()])
+        actor.owned_building = building
+        actors.append(actor)
     for actor in actors:
         potential_friends: list[Actor] = []
         for friend_amt in range(3):
-            potential_friend = random.choice(actors)
+            potential_friend = procgen_rng.choice(actors)
             if potential_friend != actor:
                 potential_friends.append(potential_friend)
         actor.friends = potential_friends
@@ -234,7 +273,8 @@ def place_actors(area: Area) -> List[Actor]:
     return actors
 
 def place_entities_area(area_map: GameMap) -> None:
-    number_of_items = random.randint(
+    procgen_rng = area_map.engine.rng.stream(rng.PROCGEN)
+    number_of_items = procgen_rng.randint(
         0, get_max_value_for_floor(max_items_by_floor, 1)
     )
     actors: List[Entity] = get_entities_at_random(
@@ -244,12 +284,12 @@ def place_entities_area(area_map: GameMap) -> None:
         item_chances, number_of_items, 1
     )
     for entity in items + actors:
-            x = random.randint(0, area_map.width - 1)
-            y = random.randint(0, area_map.height - 1)
+            x = procgen_rng.randint(0, area_map.width - 1)
+            y = procgen_rng.randint(0, area_map.height - 1)
             if isinstance(entity, Actor):
                 entity.spawn(area_map, x, y, [entity_factories.pants])
             else:
-                if not any(entity.x == x and entity.y == y for entity in area_map.entities):
+                if not area_map.get_entities_at_location(x, y):
                     entity.spawn(area_map, x, y)
                 
 def tunnel_between(
@@ -258,7 +298,7 @@ def tunnel_between(
   """Return an L-shaped tunnel between these two points."""
   x1, y1 = start
   x2, y2 = end
-  if random.random() < 0.5:  # 50% chance.
+  if rng.stream(rng.PROCGEN).random() < 0.5:  # 50% chance.
       # Move horizontally, then vertically.
       corner_x, corner_y = x2, y1
   else:
@@ -282,16 +322,17 @@ def generate_dungeon(
   """Generate a new dungeon map."""
   player = engine.player
   dungeon = GameMap(engine, map_width, map_height, entities=[player])
+  procgen_rng = engine.rng.stream(rng.PROCGEN)
 
   rooms: List[RectangularRoom] = []
   center_of_last_room = (0, 0)
 
   for r in range(max_rooms):
-      room_width = random.randint(room_min_size, room_max_size)
-      room_height = random.randint(room_min_size, room_max_size)
+      room_width = procgen_rng.randint(room_min_size, room_max_size)
+      room_height = procgen_rng.randint(room_min_size, room_max_size)
 
-      x = random.randint(0, dungeon.width - room_width - 1)
-      y = random.randint(0, dungeon.height - room_height - 1)
+      x = procgen_rng.randint(0, dungeon.width - room_width - 1)
+      y = procgen_rng.randint(0, dungeon.height - room_height - 1)
 
       # "RectangularRoom" class makes rectangles easier to work with
       new_room = RectangularRoom(x, y, room_width, room_height)
@@ -329,6 +370,7 @@ def _generate_area_map(
     """Generate a new area map."""
     player = engine.player
     area = GameMap(engine, map_width, map_height, entities=[player])
+    procgen_rng = engine.rng.stream(rng.PROCGEN)
     new_area = Area(map_width, map_height)
     area.tiles[new_area.inner()] = tile_types.floor
     buildings: List[Building] = []
@@ -338,11 +380,11 @@ def _generate_area_map(
 
 
     for b in range(max_buildings):
-        schematic = random.choice(list(building_schematics))
+        schematic = procgen_rng.choice(list(building_schematics))
         schematic_h = len(schematic)
         schematic_w = len(schematic[0])
-        x = random.randint(0, area.width - schematic_w - 5)
-        y = random.randint(0, area.height - schematic_h - 5)
+        x = procgen_rng.randint(0, area.width - schematic_w - 5)
+        y = procgen_rng.randint(0, area.height - schematic_h - 5)
         new_building = Building(x, y, schematic)
         placement_attempts = 0
         # FIXME: Buildings that can't be placed are put into `buildings`, prevent that
@@ -363,7 +405,7 @@ def _generate_area_map(
             buildings.append(new_building)
             break
 
-    print(f"Created {len(buildings)} buildings")
+    logger.debug("Created %d buildings", len(buildings))
     area.buildings = buildings
     place_actors(area)
     return area
@@ -372,9 +414,14 @@ def generate_area_map(
    map_width: int,
    map_height: int,
    engine: Engine,
+   npc_count: Optional[int] = None,
 ) -> GameMap:
-    """Generate a new area map."""
+    """Generate a new area map.
+
+    There is one resident per house, unless `npc_count` is given.
+    """
     player: Actor = engine.player
+    procgen_rng = engine.rng.stream(rng.PROCGEN)
 
     area_map = GameMap(engine, map_width, map_height, entities=[player])
     new_area = Area(map_width, map_height, area_map)
@@ -393,23 +440,23 @@ def generate_area_map(
     # each building is on a plot that has a square size
     standard_plot = 12 #for now, every plot is this size
 
-    # Determine how many plots we can have horizontally and vertically
-    horizontal_plots = int(map_width  / (standard_plot + 1))
-    vertical_plots = int(map_height / (standard_plot + 1))
-
     # Set our starting point
     # Plots should start at least two tiles into the area map
     plot_start_x = 2
     plot_start_y = 2
 
+    # Determine how many plots we can have horizontally and vertically
+    horizontal_plots = int((map_width - plot_start_x) / (standard_plot + 1))
+    vertical_plots = int((map_height - plot_start_y) / (standard_plot + 1))
+
     # Create vertical and horizontal plots
     # There should be 1 tile of space between each plot
     # Plots are created in rows from top to bottom of the map
     for vertical_plot in range(vertical_plots):
         for horizontal_plot in range(horizontal_plots):
             # Set this plot's origin (top-left corner)
-            plot_origin_x = plot_start_x
-            plot_origin_y = plot_start_y
+            plot_origin_x = plot_start_x + (standard_plot + 1) * horizontal_plot
+            plot_origin_y = plot_start_y + (standard_plot + 1) * vertical_plot
 
             # Create the plot object
             newPlot = Plot(
@@ -418,7 +465,9 @@ def generate_area_map(
                 width=standard_plot,
                 height=standard_plot
             )
-            print(f"Creating a new plot ({vertical_plot}/{horizontal_plot}) at ({newPlot.x}, {newPlot.y})")
+            logger.debug(
+                "Creating a new plot (%d/%d) at (%d, %d)", vertical_plot, horizontal_plot, newPlot.x, newPlot.y
+            )
            
             # Fill in the plot with grass tiles
             # Mostly for debug purposes
@@ -430,7 +479,7 @@ def generate_area_map(
             
             # -- Create a building originating at the top-left of this plot
             # Select the schematic, capture width and height
-            schematic = random.choice(list(building_schematics))
+            schematic = procgen_rng.choice(list(building_schematics))
             schematic_h = len(schematic)
             schematic_w = len(schematic[0])
 
@@ -460,18 +509,15 @@ def generate_area_map(
 
             buildings.append(new_building)
             plots.append(newPlot)
-            next_x = 1 + ((standard_plot + 1) * horizontal_plot + 1 )
-            plot_start_x = next_x
-            plot_start_y = 1 + ((standard_plot + 1) * vertical_plot + 1)
   
-    print(f"Created {len(buildings)} buildings")
+    logger.debug("Created %d buildings", len(buildings))
     # This should be removed
     area_map.buildings = buildings
     new_area.buildings = buildings
     new_area.plots = plots
     new_area._game_map = area_map
-    actors = place_actors(new_area)
-    evil_actor = random.choice(actors)
+    actors = place_actors(new_area, npc_count)
+    evil_actor = procgen_rng.choice(actors)
     evil_actor.color = (255, 0, 0)
     evil_actor.evil = True
     evil_actor.ai = EvilNPC(evil_actor)
@@ -480,5 +526,16 @@ def generate_area_map(
     evil_actor.inventory.add(knife)
     evil_actor.equipment.equip(knife, True)
 
-    print(f"{evil_actor.name} is the murderer")
+    logger.debug("%s is the murderer", evil_actor.name)
+
+    # The town layout is final, so work out every resident's way home now,
+    # and the entrances between plots for long trips across town. Each
+    # cluster of the hierarchy is one plot plus the street to its west and north.
+    area_map.flow_fields.precompute()
+    area_map.path_hierarchy = PathHierarchy(
+        area_map,
+        cluster_size=standard_plot + 1,
+        origin=(plot_start_x - 1, plot_start_y - 1),
+    )
+    area_map.path_hierarchy.precompute()
     return area_map
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Named, seedable streams of random numbers.
+
+Each part of the game draws from its own stream, so that a seed reproduces a whole
+run, and drawing more numbers in one part (such as combat) does not change what
+happens in another (such as NPCs wandering). The Engine owns its streams and saves
+them with the game.
+
+    stream = engine.rng.stream(rng.COMBAT)
+    damage = stream.randint(1, 6)
+    directions = stream.integers(0, 8, size=len(wanderers))
+
+Code which has no Engine to hand, such as the entity factories, uses the module
+level stream() function. That draws from the streams of the active Engine, which
+is whichever one was created, loaded or restored last.
+"""
+from __future__ import annotations
+import random
+import zlib
+from typing import Any, Dict, List, MutableSequence, Optional, Sequence, TypeVar
+import numpy as np  # type: ignore
+
+T = TypeVar("T")
+
+# Streams
+AI = "ai"
+BODY = "body"
+COMBAT = "combat"
+EQUIPMENT = "equipment"
+NAMES = "names"
+PROCGEN = "procgen"
+
+
+class RandomStream:
+    """
+    A single stream of random numbers.
+
+    Single draws come from a Python random.Random, which is fastest one at a time.
+    Batch draws come from a NumPy Generator, for filling whole arrays at once.
+    Both are seeded from the same SeedSequence, so the stream is reproducible.
+    """
+
+    def __init__(self, seed_sequence: np.random.SeedSequence):
+        self._random = random.Random(int(seed_sequence.generate_state(2, np.uint64)[0]))
+        self.generator = np.random.Generator(np.random.PCG64(seed_sequence))
+
+    # Single draws, matching the random module.
+    def random(self) -> float:
+        return self._random.random()
+
+    def randint(self, a: int, b: int) -> int:
+        """Return a random integer N such that a <= N <= b."""
+        return self._random.randint(a, b)
+
+    def choice(self, sequence: Sequence[T]) -> T:
+        return self._random.choice(sequence)
+
+    def choices(self, population: Sequence[T], weights: Optional[Sequence[float]] = None, k: int = 1) -> List[T]:
+        return self._random.choices(population, weights=weights, k=k)
+
+    def shuffle(self, sequence: MutableSequence[Any]) -> None:
+        self._random.shuffle(sequence)
+
+    # Batch draws
+    def integers(self, low: int, high: int, size: Any = None) -> np.ndarray:
+        """Return random integers from low (inclusive) to high (exclusive)."""
+        return self.generator.integers(low, high, size=size)
+
+    def uniform(self, size: Any = None) -> np.ndarray:
+        """Return random floats in the half-open interval [0.0, 1.0)."""
+        return self.generator.random(size)
+
+
+class RandomStreams:
+    """
+    A set of named streams, all derived from one seed.
+
+    Every stream's seed depends only on the master seed and the stream's name,
+    so streams can be created in any order and still draw the same numbers.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.reseed(seed)
+
+    def reseed(self, seed: Optional[int] = None) -> None:
+        """Start every stream over from `seed`, or from fresh entropy if it is None."""
+        self._seed_sequence = np.random.SeedSequence(seed)
+        self.seed = self._seed_sequence.entropy
+        self._streams: Dict[str, RandomStream] = {}
+
+    def stream(self, name: str) -> RandomStream:
+        """Return the stream called `name`, creating it the first time."""
+        stream = self._streams.get(name)
+        if stream is None:
+            seed_sequence = np.random.SeedSequence(
+                self.seed, spawn_key=(zlib.crc32(name.encode("utf-8")),)
+            )
+            stream = self._streams[name] = RandomStream(seed_sequence)
+        return stream
+
+
+# The streams of the active Engine. Until one is activated, such as while the
+# entity prototypes are built on import, these fixed ones are used instead.
+_active = RandomStreams(0)
+
+
+def activate(streams: RandomStreams) -> None:
+    """Make `streams` the ones drawn from by code without an Engine of its own."""
+    global _active
+    _active = streams
+
+
+def stream(name: str) -> RandomStream:
+    """Return the active Engine's stream called `name`."""
+    return _active.stream(name)
@@ -0,0 +1,66 @@
+"""
+Save slots: every game is saved to its own file in SAVE_DIRECTORY.
+
+Each save has a small JSON index next to it, written by savefile along with the
+save. Listing saves only reads those indexes, so it stays quick however many
+saves there are and however big they get.
+
+    for slot in list_slots():
+        print(slot.player_name, slot.phase, slot.saved_at_text)
+    engine = savefile.load(slot.filename)
+"""
+from __future__ import annotations
+import glob
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+import savefile
+
+SAVE_DIRECTORY = "saves"
+
+SLOT_PATTERN = re.compile(r"slot(\d+)\.(?:sav|json)$")
+
+
+class SaveSlot:
+    """A save file, as described by its index."""
+
+    def __init__(self, filename: str, index: Dict[str, Any]):
+        self.filename = filename
+        self.player_name: str = index.get("player", "Unknown")
+        self.tick: int = index.get("tick", 0)
+        self.phase: str = index.get("phase", "")
+        self.saved_at: float = index.get("saved_at", 0.0)
+        self.thumbnail: List[str] = index.get("thumbnail", [])
+
+    @property
+    def saved_at_text(self) -> str:
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(self.saved_at))
+
+
+def list_slots(directory: str = SAVE_DIRECTORY) -> List[SaveSlot]:
+    """Return every save in `directory` which has an index, the most recently saved first."""
+    slots = []
+    for filename in glob.glob(os.path.join(directory, "*.sav")):
+        index = savefile.read_index(filename)
+        if index is not None:
+            slots.append(SaveSlot(filename, index))
+    slots.sort(key=lambda slot: slot.saved_at, reverse=True)
+    return slots
+
+
+def latest_save(directory: str = SAVE_DIRECTORY) -> Optional[str]:
+    """Return the most recently saved file, or None if there are no saves."""
+    slots = list_slots(directory)
+    return slots[0].filename if slots else None
+
+
+def new_slot(directory: str = SAVE_DIRECTORY) -> str:
+    """Return the filename of a slot which no save uses yet."""
+    os.makedirs(directory, exist_ok=True)
+    numbers = [
+        int(match.group(1))
+        for match in (SLOT_PATTERN.match(name) for name in os.listdir(directory))
+        if match is not None
+    ]
+    return os.path.join(directory, f"slot{max(numbers, default=0) + 1}.sav")
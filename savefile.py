@@ -0,0 +1,702 @@
+"""
+The save file format.
+
+A save file is a short header followed by named sections:
+
+    area         The map's static data: its buildings, pathfinding and tile types.
+    tile_ids     The map's tiles, as indexes into the area's tile types.
+    entities     Every entity on the map, each pickled on its own.
+    engine       Everything else, such as the time of day and the message log.
+    changes      The entities which changed since the entities section was written.
+    positions    Every entity's id, x and y, as an array.
+    hunger       Every actor's id and hunger, as an array.
+    explored     Bitmaps of the tiles the player has explored, can see, and can see
+    visible      through (which changes as doors open).
+    transparent
+
+The tile_ids, bitmap, positions and hunger sections are stored uncompressed, so
+they are read straight out of the memory mapped file with np.frombuffer.
+
+The area and tile_ids sections are written once per map, and carried over
+unchanged by every later save of it. The entities section is a checkpoint, which
+later saves also carry over. After it, only the entities which the GameMap noted
+as changed are pickled again, so a save costs as much as what changed since the
+last one. A new checkpoint is written once the changes add up to most of it.
+
+Every actor moves and gets hungrier all the time, so those are left to the
+positions and hunger sections, which override whatever the entities' records
+hold. Moving alone never makes an entity count as changed.
+
+The header is JSON, listing where each section starts, how long it is and how it
+is compressed. Sections start on ALIGNMENT byte boundaries.
+
+Saves are written to a temporary file, which then replaces the old save, so a
+save cut short by a crash leaves the last one as it was. save_in_background()
+pickles what changed straight away, but compresses and writes it on a worker thread.
+PendingLoad loads a save on that same thread, so a menu can carry on drawing.
+
+Every save also writes a small JSON index next to it, such as slot1.json for
+slot1.sav. It holds the player's name, the time of day and a thumbnail of the
+explored map, so that saves can be listed without opening them, see save_slots.py.
+"""
+from __future__ import annotations
+import copyreg
+import io
+import json
+import lzma
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+import weakref
+import numpy as np  # type: ignore
+import debug_log
+import rng
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from entity import Entity
+    from game_map import GameMap
+
+logger = debug_log.get_logger(debug_log.SAVE)
+
+MAGIC = b"NFSAVE\r\n"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# A new checkpoint is written once the changed entities add up to this fraction of the checkpoint's.
+CHECKPOINT_RATIO = 0.75
+
+# The version of the index written next to each save, see describe().
+INDEX_VERSION = 1
+
+# The most characters across and down a save's thumbnail of the explored map.
+THUMBNAIL_SIZE = (24, 8)
+
+# The sections which are carried over unchanged by later saves.
+CARRIED_SECTIONS = ("area", "tile_ids", "entities")
+
+# The GameMap's bool arrays, each saved as a bitmap.
+BITMAP_LAYERS = ("explored", "visible")
+
+# The GameMap attributes which are only derived from its entities, left out of saves and rebuilt on load.
+DERIVED_MAP_ATTRIBUTES = (
+    "_entities_by_location",
+    "_entity_locations",
+    "_path_cost",
+    "_map_layer",
+    "entity_layer",
+    "entity_grids",
+    "changed_entities",
+)
+
+# The GameMap attributes saved in the area section, along with its buildings and tile types.
+AREA_MAP_ATTRIBUTES = ("flow_fields", "path_hierarchy")
+
+
+class SaveFormatError(Exception):
+    """Raised when a file is not a save file, or is damaged."""
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "lzma":
+        return lzma.compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 1)
+    return data
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "lzma":
+        return lzma.decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+class Section:
+    """
+    One section of a save file, compressed the first time its data is needed.
+
+    Sections are made on the main thread, and may be compressed on the save thread.
+    """
+
+    def __init__(
+        self,
+        codec: str,
+        raw: Optional[bytes] = None,
+        data: Optional[bytes] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ):
+        """`info` is added to the section's entry in the header, such as an array's shape."""
+        self.codec = codec
+        self._raw = raw
+        self._data = data
+        self.info = info or {}
+        self._lock = threading.Lock()
+
+    def data(self) -> bytes:
+        """Return the section's compressed data."""
+        with self._lock:
+            if self._data is None:
+                self._data = _compress(self._raw, self.codec)
+                self._raw = None
+            return self._data
+
+
+def _reference(key: Tuple[Any, ...]) -> Any:
+    """Stands in for an object saved in another section. _Unpickler looks these up instead."""
+    raise SaveFormatError("References can only be followed while loading a save.")
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Pickles one part of the game, writing references in place of the objects other parts own.
+
+    This uses reducer_override rather than persistent_id, since it is not called for
+    plain lists, dicts, strings and numbers. Those make up most of what is pickled,
+    so only objects which could be references cost a Python call.
+    """
+
+    def __init__(
+        self,
+        file: io.BytesIO,
+        references: Dict[int, Tuple[Any, ...]],
+        game_map: Optional[GameMap] = None,
+    ):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.references = references
+        # The map written out in full here, without what is derived from its entities.
+        self.game_map = game_map
+
+    def reducer_override(self, obj: Any) -> Any:
+        key = self.references.get(id(obj))
+        if key is not None:
+            return _reference, (key,)
+        if obj is self.game_map:
+            state = {
+                name: value for name, value in obj.__dict__.items() if name not in DERIVED_MAP_ATTRIBUTES
+            }
+            return copyreg.__newobj__, (type(obj),), state
+        return NotImplemented
+
+
+class _Unpickler(pickle.Unpickler):
+    """Unpickles one part of the game, looking up the references _Pickler wrote."""
+
+    def __init__(self, data: bytes, objects: Dict[Tuple[Any, ...], Any]):
+        super().__init__(io.BytesIO(data))
+        self.objects = objects
+
+    def find_class(self, module: str, name: str) -> Any:
+        if module == __name__ and name == "_reference":
+            return self._lookup
+        return super().find_class(module, name)
+
+    def _lookup(self, key: Tuple[Any, ...]) -> Any:
+        try:
+            return self.objects[tuple(key)]
+        except KeyError:
+            raise SaveFormatError(f"Unknown reference {key!r}.") from None
+
+
+class SaveWriter:
+    """
+    Saves one Engine, remembering its last checkpoint so that later saves only encode what changed.
+    """
+
+    def __init__(self) -> None:
+        self.game_map: Optional[GameMap] = None
+        # The id each entity's record is filed under.
+        self.entity_ids: weakref.WeakKeyDictionary[Entity, int] = weakref.WeakKeyDictionary()
+        self.next_entity_id = 0
+        # The area and entities sections.
+        self.carried: Dict[str, Section] = {}
+        self.walkable_version = 0
+        self.checkpoint_size = 0
+        # The latest record of every entity, and those pickled since the checkpoint.
+        # Records of entities which left the map are kept, as others may refer to them.
+        self.records: Dict[int, Tuple[type, bytes]] = {}
+        self.changes: Dict[int, Tuple[type, bytes]] = {}
+
+    def snapshot(self, engine: Engine) -> Dict[str, Section]:
+        """Return the sections of a save of `engine`, as it is now.
+
+        This only pickles what changed. The sections are compressed later, when
+        they are written, so that can be done on another thread.
+        """
+        game_map = engine.game_map
+        changed = game_map.take_changed_entities()
+        if game_map is not self.game_map:
+            # A whole new map, so nothing from the last checkpoint is any use.
+            self.game_map = game_map
+            self.entity_ids = weakref.WeakKeyDictionary()
+            self.carried = {}
+            self.records = {}
+            self.changes = {}
+            changed = list(game_map.entities)
+        # The player's own actions change them in too many ways to keep track of.
+        changed.append(engine.player)
+        for entity in changed:
+            if entity in game_map.entities and entity not in self.entity_ids:
+                self.entity_ids[entity] = self.next_entity_id
+                self.next_entity_id += 1
+
+        # Looked up once, as the WeakKeyDictionary is slow to read from one entity at a time.
+        entity_ids = [self.entity_ids[entity] for entity in game_map.entities]
+        references = self._references(engine, entity_ids)
+        if "area" not in self.carried or self.walkable_version != game_map.walkable_version:
+            # Tiles only change walkability when the map is rebuilt, but if they ever did it would show here.
+            self._write_area(game_map, references)
+        for entity in changed:
+            if entity in game_map.entities:
+                entity_id = self.entity_ids[entity]
+                record = (type(entity), self._dump(entity.__dict__, references))
+                self.records[entity_id] = self.changes[entity_id] = record
+        changed_size = sum(len(record) for _, record in self.changes.values())
+        if "entities" not in self.carried or changed_size > self.checkpoint_size * CHECKPOINT_RATIO:
+            self._write_checkpoint()
+
+        sections = dict(self.carried)
+        # The engine and its map are what this section holds, so they are written out in full.
+        engine_references = {
+            key: value for key, value in references.items() if value[0] not in ("engine", "game_map")
+        }
+        sections["engine"] = Section("zlib", raw=self._dump(engine, engine_references, game_map))
+        sections["changes"] = Section("zlib", raw=pickle.dumps(self.changes, pickle.HIGHEST_PROTOCOL))
+        sections["positions"], sections["hunger"] = self._columns(game_map, entity_ids)
+        for name in BITMAP_LAYERS:
+            sections[name] = _bitmap_section(getattr(game_map, name))
+        # Doors change whether their tiles are transparent as they open.
+        sections["transparent"] = _bitmap_section(game_map.tiles["transparent"])
+        logger.debug(
+            "Saving %d entities which changed, %d since the checkpoint", len(changed), len(self.changes)
+        )
+        return sections
+
+    def _write_area(self, game_map: GameMap, references: Dict[int, Tuple[Any, ...]]) -> None:
+        # Each distinct tile is stored once, with every tile of the map an index into them.
+        tiles = game_map.tiles
+        tile_types, tile_ids = np.unique(
+            tiles.reshape(-1, order="F").view(f"V{tiles.dtype.itemsize}"), return_inverse=True
+        )
+        tile_ids = tile_ids.astype(np.uint8 if len(tile_types) <= 256 else np.uint16)
+        area = {name: getattr(game_map, name) for name in AREA_MAP_ATTRIBUTES}
+        area["buildings"] = game_map.buildings
+        area["tile_types"] = tile_types.view(tiles.dtype)
+        # The area section holds these, so it must not refer to them.
+        area_references = {
+            key: value for key, value in references.items() if value[0] not in ("area", "building")
+        }
+        self.carried["area"] = Section("lzma", raw=self._dump(area, area_references))
+        self.carried["tile_ids"] = _array_section(tile_ids.reshape(tiles.shape, order="F"))
+        self.walkable_version = game_map.walkable_version
+
+    def _write_checkpoint(self) -> None:
+        self.carried["entities"] = Section("zlib", raw=pickle.dumps(self.records, pickle.HIGHEST_PROTOCOL))
+        self.checkpoint_size = sum(len(record) for _, record in self.records.values())
+        self.changes = {}
+        logger.debug("Wrote a checkpoint of %d entities", len(self.records))
+
+    @staticmethod
+    def _columns(game_map: GameMap, entity_ids: List[int]) -> Tuple[Section, Section]:
+        """Return the positions and hunger sections, which are written in full every save."""
+        from entity import Actor
+
+        positions = np.array(
+            [(entity_id, entity.x, entity.y) for entity, entity_id in zip(game_map.entities, entity_ids)],
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        hunger = np.array(
+            [
+                (entity_id, entity.body._hunger)
+                for entity, entity_id in zip(game_map.entities, entity_ids)
+                if isinstance(entity, Actor)
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        return _array_section(positions), _array_section(hunger)
+
+    @staticmethod
+    def _references(engine: Engine, entity_ids: List[int]) -> Dict[int, Tuple[Any, ...]]:
+        """Map the ids of objects owned by other parts of the save to how they are referred to."""
+        game_map = engine.game_map
+        references: Dict[int, Tuple[Any, ...]] = {
+            id(engine): ("engine",),
+            id(game_map): ("game_map",),
+            id(game_map.tiles): ("layer", "tiles"),
+        }
+        for name in BITMAP_LAYERS:
+            references[id(getattr(game_map, name))] = ("layer", name)
+        for name in AREA_MAP_ATTRIBUTES:
+            references[id(getattr(game_map, name))] = ("area", name)
+        for index, building in enumerate(game_map.buildings):
+            references[id(building)] = ("building", index)
+        for entity, entity_id in zip(game_map.entities, entity_ids):
+            references[id(entity)] = ("entity", entity_id)
+        return references
+
+    @staticmethod
+    def _dump(
+        obj: Any, references: Dict[int, Tuple[Any, ...]], game_map: Optional[GameMap] = None
+    ) -> bytes:
+        """Pickle `obj`, with references in place of everything saved elsewhere."""
+        buffer = io.BytesIO()
+        _Pickler(buffer, references, game_map).dump(obj)
+        return buffer.getvalue()
+
+
+def _array_section(array: np.ndarray) -> Section:
+    """Store an array uncompressed, to be read back with read_array."""
+    return Section(
+        "raw", raw=array.tobytes(order="F"), info={"dtype": array.dtype.str, "shape": list(array.shape)}
+    )
+
+
+def _bitmap_section(array: np.ndarray) -> Section:
+    """Store a bool array as a bitmap, to be read back with read_bitmap."""
+    bits = np.packbits(array.reshape(-1, order="F"))
+    return Section("raw", raw=bits.tobytes(), info={"dtype": bits.dtype.str, "shape": list(array.shape)})
+
+
+# The SaveWriter of each Engine, so that saves made while playing can build on each other.
+# They are kept here rather than on the Engine so they never end up inside a save.
+_writers: weakref.WeakKeyDictionary[Engine, SaveWriter] = weakref.WeakKeyDictionary()
+
+
+def writer_for(engine: Engine) -> SaveWriter:
+    """Return the SaveWriter for `engine`, creating it the first time."""
+    writer = _writers.get(engine)
+    if writer is None:
+        writer = _writers[engine] = SaveWriter()
+    return writer
+
+
+def save(engine: Engine, filename: str) -> None:
+    """Save `engine` to `filename`, once any saves still being written in the background are done."""
+    sections = writer_for(engine).snapshot(engine)
+    index = describe(engine)
+    wait_for_writes()
+    write_file(filename, sections, index)
+
+
+# Saves are compressed and written, and loaded in the background, one at a time on this
+# thread. So a load always waits for the saves before it. It is created on first use.
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: List[Future] = []
+
+
+def _save_thread() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save")
+    return _executor
+
+
+def save_in_background(engine: Engine, filename: str) -> Future:
+    """Snapshot `engine` now, then compress and write it to `filename` on the save thread."""
+    future = _save_thread().submit(write_file, filename, writer_for(engine).snapshot(engine), describe(engine))
+    future.add_done_callback(_log_failure)
+    _pending[:] = [pending for pending in _pending if not pending.done()]
+    _pending.append(future)
+    return future
+
+
+def _log_failure(future: Future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background save failed", exc_info=exc)
+
+
+def wait_for_writes() -> None:
+    """Wait until every save being written in the background is on disk."""
+    for future in _pending:
+        try:
+            future.result()
+        except Exception:
+            pass  # Already logged.
+    _pending.clear()
+
+
+def delete(filename: str) -> None:
+    """Delete a save file and its index, along with any save of it still being written."""
+    wait_for_writes()
+    for path in (filename, index_filename(filename)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_file(filename: str, sections: Dict[str, Section], index: Optional[Dict[str, Any]] = None) -> None:
+    """Write sections to `filename` as a save file, and `index` next to it if given.
+
+    Each file is written next to where it goes first, then moved over it, so a
+    crash part way through leaves the last save as it was.
+    """
+    _write_atomically(filename, pack(sections))
+    if index is not None:
+        _write_atomically(index_filename(filename), json.dumps(index).encode("utf-8"))
+
+
+def _write_atomically(filename: str, data: bytes) -> None:
+    temporary = f"{filename}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, filename)
+
+
+def index_filename(filename: str) -> str:
+    """Return the name of the index written next to the save file `filename`."""
+    return os.path.splitext(filename)[0] + ".json"
+
+
+def describe(engine: Engine) -> Dict[str, Any]:
+    """Return the index of a save of `engine`: a few facts about the game, for listing saves."""
+    return {
+        "version": INDEX_VERSION,
+        "player": engine.player.name,
+        "tick": engine.time_cycle.tick_global,
+        "phase": engine.time_cycle.current_phase_name,
+        "saved_at": time.time(),
+        "thumbnail": thumbnail(engine.game_map.explored),
+    }
+
+
+def thumbnail(explored: np.ndarray, width: int = THUMBNAIL_SIZE[0], height: int = THUMBNAIL_SIZE[1]) -> List[str]:
+    """Shrink an explored map down to rows of text, with "#" wherever any tile was explored."""
+    width, height = min(width, explored.shape[0]), min(height, explored.shape[1])
+    # Each character covers a block of tiles, starting at these tiles.
+    xs = np.linspace(0, explored.shape[0], width, endpoint=False).astype(np.intp)
+    ys = np.linspace(0, explored.shape[1], height, endpoint=False).astype(np.intp)
+    blocks = np.logical_or.reduceat(np.logical_or.reduceat(explored, xs, axis=0), ys, axis=1)
+    return ["".join("#" if block else " " for block in row) for row in blocks.T.tolist()]
+
+
+def read_index(filename: str) -> Optional[Dict[str, Any]]:
+    """Return the index written next to the save file `filename`, or None if it has none."""
+    try:
+        with open(index_filename(filename), "rb") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def pack(sections: Dict[str, Section]) -> bytes:
+    """Lay out encoded sections behind a header, returning the whole save file."""
+    # Offsets depend on the header's length, which depends on the offsets, so
+    # the header is laid out with room to spare and padded to fit.
+    table: Dict[str, Dict[str, Any]] = {}
+    header_space = ALIGNMENT * 4
+    while True:
+        offset = header_space
+        for name, section in sections.items():
+            data = section.data()
+            table[name] = {"offset": offset, "length": len(data), "codec": section.codec, **section.info}
+            offset += -(-len(data) // ALIGNMENT) * ALIGNMENT
+        header = json.dumps({"version": FORMAT_VERSION, "sections": table}).encode("utf-8")
+        if len(MAGIC) + 4 + len(header) <= header_space:
+            break
+        header_space *= 2
+
+    out = bytearray(offset)
+    out[: len(MAGIC)] = MAGIC
+    out[len(MAGIC) : len(MAGIC) + 4] = struct.pack("<I", len(header))
+    out[len(MAGIC) + 4 : len(MAGIC) + 4 + len(header)] = header
+    for name, section in sections.items():
+        data = section.data()
+        start = table[name]["offset"]
+        out[start : start + len(data)] = data
+    return bytes(out)
+
+
+def read_header(data: bytes) -> Dict[str, Any]:
+    """Return the header of a save file's contents."""
+    if data[: len(MAGIC)] != MAGIC:
+        raise SaveFormatError("Not a save file.")
+    (length,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    try:
+        header = json.loads(bytes(data[start : start + length]).decode("utf-8"))
+    except ValueError as exc:
+        raise SaveFormatError("The save file's header is damaged.") from exc
+    if header.get("version") != FORMAT_VERSION:
+        raise SaveFormatError(f"Unsupported save file version {header.get('version')!r}.")
+    return header
+
+
+def read_section(data: Any, header: Dict[str, Any], name: str) -> bytes:
+    """Return the decompressed contents of a section."""
+    entry = _section_entry(header, name)
+    start = entry["offset"]
+    raw = data[start : start + entry["length"]]
+    if len(raw) != entry["length"]:
+        raise SaveFormatError(f"The save file's {name} section is cut short.")
+    return _decompress(bytes(raw), entry["codec"])
+
+
+def _section_entry(header: Dict[str, Any], name: str, codec: Optional[str] = None) -> Dict[str, Any]:
+    try:
+        entry = header["sections"][name]
+    except KeyError:
+        raise SaveFormatError(f"The save file has no {name} section.") from None
+    if codec is not None and entry["codec"] != codec:
+        raise SaveFormatError(f"The save file's {name} section is not stored as {codec}.")
+    return entry
+
+
+def read_array(data: Any, header: Dict[str, Any], name: str) -> np.ndarray:
+    """Return an array section as a read only view of `data`, without copying it."""
+    entry = _section_entry(header, name, "raw")
+    shape = tuple(entry["shape"])
+    count = int(np.prod(shape))
+    if entry["offset"] + count * np.dtype(entry["dtype"]).itemsize > len(data):
+        raise SaveFormatError(f"The save file's {name} section is cut short.")
+    array = np.frombuffer(data, dtype=entry["dtype"], count=count, offset=entry["offset"])
+    return array.reshape(shape, order="F")
+
+
+def read_bitmap(data: Any, header: Dict[str, Any], name: str) -> np.ndarray:
+    """Return a bitmap section as a new bool array."""
+    entry = _section_entry(header, name, "raw")
+    shape = tuple(entry["shape"])
+    count = int(np.prod(shape))
+    if entry["offset"] + entry["length"] > len(data):
+        raise SaveFormatError(f"The save file's {name} section is cut short.")
+    bits = np.frombuffer(data, dtype=np.uint8, count=entry["length"], offset=entry["offset"])
+    return np.unpackbits(bits, count=count).view(np.bool_).reshape(shape, order="F")
+
+
+def load(filename: str) -> Engine:
+    """Load an Engine from a save file."""
+    engine = _read(filename)
+    rng.activate(engine.rng)
+    return engine
+
+
+class PendingLoad:
+    """
+    A save file being loaded on the save thread.
+
+    `progress` goes from 0 to 1 as the file is loaded. result() waits for whatever
+    is left, then hands the Engine over to the calling thread, as load() would.
+
+        pending = PendingLoad("saves/slot1.sav")
+        ...
+        engine = pending.result()
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.progress = 0.0
+        self._future = _save_thread().submit(_read, filename, self._report)
+
+    def _report(self, progress: float) -> None:
+        self.progress = progress
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def result(self) -> Engine:
+        """Return the loaded Engine, raising whatever stopped it loading."""
+        engine = self._future.result()
+        # The random streams are only activated here, on the thread which plays the game.
+        rng.activate(engine.rng)
+        return engine
+
+
+def _report_nothing(progress: float) -> None:
+    pass
+
+
+def _read(filename: str, progress: Callable[[float], None] = _report_nothing) -> Engine:
+    """Load an Engine from a save file, calling `progress` with how much of it is done."""
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise SaveFormatError("The save file is empty.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[: len(MAGIC)] != MAGIC:
+                # Saves from before sections pickled the whole Engine, which no longer
+                # matches the classes it was pickled from, so they are not loaded.
+                raise SaveFormatError("Not a save file, or a save from an older version of the game.")
+            engine = _load_sections(data, progress)
+    progress(1.0)
+    return engine
+
+
+def _load_sections(data: Any, progress: Callable[[float], None]) -> Engine:
+    from engine import Engine
+
+    header = read_header(data)
+
+    checkpoint_records: Dict[int, Tuple[type, bytes]] = pickle.loads(read_section(data, header, "entities"))
+    changes: Dict[int, Tuple[type, bytes]] = pickle.loads(read_section(data, header, "changes"))
+    records = {**checkpoint_records, **changes}
+
+    # Every entity is created empty first, so that records can refer to each other in any order.
+    objects: Dict[Tuple[Any, ...], Any] = {
+        ("entity", entity_id): cls.__new__(cls) for entity_id, (cls, _) in records.items()
+    }
+    objects[("game_map",)] = None
+    area = _Unpickler(read_section(data, header, "area"), objects).load()
+    for name in AREA_MAP_ATTRIBUTES:
+        objects[("area", name)] = area[name]
+    for index, building in enumerate(area["buildings"]):
+        objects[("building", index)] = building
+    # Looking every tile's type up builds the map's tiles in one go, straight from the file.
+    tiles = np.asfortranarray(area["tile_types"][read_array(data, header, "tile_ids")])
+    tiles["transparent"] = read_bitmap(data, header, "transparent")
+    objects[("layer", "tiles")] = tiles
+    for name in BITMAP_LAYERS:
+        objects[("layer", name)] = np.asfortranarray(read_bitmap(data, header, name))
+    engine = _Unpickler(read_section(data, header, "engine"), objects).load()
+    assert isinstance(engine, Engine)
+    game_map = engine.game_map
+    objects[("engine",)] = engine
+    objects[("game_map",)] = game_map
+    progress(0.2)
+    # Filling in the entities is most of the work of loading.
+    for index, (entity_id, (_, record)) in enumerate(records.items()):
+        objects[("entity", entity_id)].__dict__.update(_Unpickler(record, objects).load())
+        if index % 256 == 0:
+            progress(0.2 + 0.7 * index / len(records))
+    # Records only hold where entities were, and how hungry, when they last changed otherwise.
+    for entity_id, x, y in read_array(data, header, "positions").tolist():
+        entity = objects[("entity", entity_id)]
+        entity.x, entity.y = x, y
+    for entity_id, hunger in read_array(data, header, "hunger").tolist():
+        objects[("entity", entity_id)].body._hunger = hunger
+    progress(0.9)
+
+    game_map.flow_fields.game_map = game_map
+    game_map.path_hierarchy.game_map = game_map
+    game_map.rebuild_entity_indexes()
+
+    # Carry on from this file's checkpoint when the game is saved again.
+    writer = writer_for(engine)
+    writer.game_map = game_map
+    writer.carried = {name: _carried_section(data, header, name) for name in CARRIED_SECTIONS}
+    writer.walkable_version = game_map.walkable_version
+    writer.checkpoint_size = sum(len(record) for _, record in checkpoint_records.values())
+    writer.records = records
+    writer.changes = changes
+    for entity_id in records:
+        entity = objects[("entity", entity_id)]
+        writer.entity_ids[entity] = entity_id
+    writer.next_entity_id = max(records, default=-1) + 1
+    return engine
+
+
+def _carried_section(data: Any, header: Dict[str, Any], name: str) -> Section:
+    """Copy a section out of a loaded file as it is, so that it can be written again."""
+    entry = dict(_section_entry(header, name))
+    offset, length, codec = entry.pop("offset"), entry.pop("length"), entry.pop("codec")
+    return Section(codec, data=bytes(data[offset : offset + length]), info=entry)
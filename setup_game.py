@@ -8,10 +8,10 @@ from namegen import NameGenerator
 from game_settings import GameConfig
 from generators.equipment import generate_weapon
 from entity_factories import create_person
-import lzma
-import pickle
 import traceback
 import random
+import savefile
+import save_slots
 import tcod
 import color
 import input_handlers
@@ -22,15 +22,26 @@ background_image = tcod.image.load("menu_background.png")[:, :, :3]
 def new_game(
     player_first_name: str,
     player_last_name: str,
-    player_age: int
+    player_age: int,
+    *,
+    map_width: Optional[int] = None,
+    map_height: Optional[int] = None,
+    npc_count: Optional[int] = None,
+    world_file: Optional[str] = "world.txt",
+    seed: Optional[int] = None,
 ) -> Engine:
-    """Return a brand new game session as an Engine instance."""
+    """Return a brand new game session as an Engine instance.
+
+    The map size and number of NPCs come from the game config unless given.
+    A summary of the generated world is written to `world_file`, unless it is None.
+    The same `seed` always generates, and then plays out, the same game.
+    """
     # Load configuration
     config = GameConfig.load_config_json()
 
     # Set the map size for all game maps
-    map_width = config["game"]["map"]["width"]
-    map_height = config["game"]["map"]["height"]
+    map_width = map_width or config["game"]["map"]["width"]
+    map_height = map_height or config["game"]["map"]["height"]
 
     # The following fields are deprecated
     room_max_size = 10
@@ -46,7 +57,7 @@ def new_game(
     )
 
     # Create the engine
-    engine = Engine(time_cycle=time_cycle)
+    engine = Engine(time_cycle=time_cycle, seed=seed)
     # Create the game world
     engine.game_world = GameWorld(
         engine=engine,
@@ -55,6 +66,7 @@ def new_game(
         room_max_size=room_max_size,
         map_width=map_width,
         map_height=map_height,
+        npc_count=npc_count,
     )
     player = create_person(
         first_name = player_first_name,
@@ -75,7 +87,9 @@ def new_game(
         "Welcome to Nightfall. Do your best to survive.", color.welcome_text
     )
 
-    
+    if world_file is None:
+        return engine
+
     # info dump
     info_lines = []
     info_lines.append(f"Player\n")
@@ -104,20 +118,45 @@ def new_game(
         for skill, skill_value in npc.skills.items():
             info_lines.append(f"\t\t\t{skill}: {skill_value.value}\n")
 
-    with open("world.txt", "w") as world_file:
-        world_file.writelines(info_lines)
+    with open(world_file, "w") as f:
+        f.writelines(info_lines)
     return engine
 
 def load_game(filename: str) -> Engine:
     """Load an Engine instance from a file."""
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
-    assert isinstance(engine, Engine)
-    return engine
+    # This also carries on drawing from the random streams the game was saved with.
+    return savefile.load(filename)
+
+def resume_game(
+    parent: input_handlers.BaseEventHandler, pending_load: savefile.PendingLoad
+) -> input_handlers.BaseEventHandler:
+    """Play a game once it has loaded, or tell the player why it could not be loaded."""
+    try:
+        # Waits for whatever is left of loading it.
+        engine = pending_load.result()
+    except FileNotFoundError:
+        return input_handlers.PopupMessage(parent, "No saved game to load.")
+    except Exception as exc:
+        traceback.print_exc()  # Print to stderr.
+        return input_handlers.PopupMessage(parent, f"Failed to load save:\n{exc}")
+    engine.save_filename = pending_load.filename
+    return input_handlers.MainGameEventHandler(engine)
 
 class MainMenu(input_handlers.BaseEventHandler):
     """A handler for the main menu, covering rendering and input."""
     NameGenerator.load_names()
+    def __init__(self) -> None:
+        super().__init__()
+        # Start loading the last game straight away, so it is ready by the time Continue is picked.
+        self.pending_load: Optional[savefile.PendingLoad] = None
+        save_filename = save_slots.latest_save()
+        if save_filename is not None:
+            self.pending_load = savefile.PendingLoad(save_filename)
+
+    @property
+    def is_busy(self) -> bool:
+        return self.pending_load is not None and not self.pending_load.done()
+
     def on_render(self, console: tcod.Console) -> None:
         """Render the main menu on a background image."""
         # console.draw_semigraphics(background_image, 0, 0)
@@ -139,7 +178,7 @@ class MainMenu(input_handlers.BaseEventHandler):
 
         menu_width = 24
         for i, text in enumerate(
-            ["[N] Play a new game", "[C] Continue last game", "[Q] Quit"]
+            ["[N] Play a new game", "[C] Continue last game", "[L] Load a saved game", "[Q] Quit"]
         ):
             console.print(
                 console.width // 2,
@@ -151,25 +190,92 @@ class MainMenu(input_handlers.BaseEventHandler):
                 bg_blend=tcod.BKGND_ALPHA(64),
             )
 
+        if self.is_busy:
+            console.print(
+                console.width // 2,
+                console.height // 2 + 3,
+                f"Loading last game... {self.pending_load.progress:.0%}",
+                fg=color.menu_text,
+                alignment=tcod.CENTER,
+            )
+
     def ev_keydown(
         self, event: tcod.event.KeyDown
     ) -> Optional[input_handlers.BaseEventHandler]:
         if event.sym in (tcod.event.K_q, tcod.event.K_ESCAPE):
             raise SystemExit()
         elif event.sym == tcod.event.K_c:
-            try:
-                return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
-            except FileNotFoundError:
+            if self.pending_load is None:
                 return input_handlers.PopupMessage(self, "No saved game to load.")
-            except Exception as exc:
-                traceback.print_exc()  # Print to stderr.
-                return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
+            return resume_game(self, self.pending_load)
+        elif event.sym == tcod.event.K_l:
+            return LoadGameMenu(self)
         elif event.sym == tcod.event.K_n:
             # return input_handlers.MainGameEventHandler(new_game())
             return CharacterCreationMenu()
 
         return None
 
+class LoadGameMenu(input_handlers.BaseEventHandler):
+    """Lists every saved game, from their indexes alone, to pick one to load."""
+    def __init__(self, parent: MainMenu) -> None:
+        super().__init__()
+        self.parent = parent
+        self.slots = save_slots.list_slots()
+        self.cursor = 0
+
+    def on_render(self, console: tcod.Console) -> None:
+        console.draw_frame(0, 0, console.width, console.height, title="Load a saved game")
+        if not self.slots:
+            console.print(console.width // 2, console.height // 2, "No saved games.", alignment=tcod.CENTER)
+            return
+
+        # The list scrolls to keep the cursor on screen, leaving room for the thumbnail below it.
+        thumbnail_height = savefile.THUMBNAIL_SIZE[1] + 2
+        rows = console.height - thumbnail_height - 3
+        top = max(0, self.cursor - rows + 1)
+        for y, slot in enumerate(self.slots[top : top + rows], start=1):
+            selected = top + y - 1 == self.cursor
+            console.print(
+                2,
+                y,
+                f"{slot.player_name[:24]:<25}{slot.phase:<10}Tick {slot.tick:<8}{slot.saved_at_text}"[
+                    : console.width - 4
+                ],
+                fg=color.black if selected else color.menu_text,
+                bg=color.menu_text if selected else None,
+            )
+
+        slot = self.slots[self.cursor]
+        y = console.height - thumbnail_height - 1
+        console.draw_frame(2, y, savefile.THUMBNAIL_SIZE[0] + 2, thumbnail_height, title="Explored")
+        for dy, row in enumerate(slot.thumbnail[: savefile.THUMBNAIL_SIZE[1]], start=1):
+            console.print(3, y + dy, row[: savefile.THUMBNAIL_SIZE[0]], fg=color.menu_title)
+        console.print_box(
+            savefile.THUMBNAIL_SIZE[0] + 6,
+            y + 1,
+            console.width - savefile.THUMBNAIL_SIZE[0] - 8,
+            thumbnail_height - 2,
+            "[Enter] Load   [Esc] Back",
+        )
+
+    def ev_keydown(
+        self, event: tcod.event.KeyDown
+    ) -> Optional[input_handlers.BaseEventHandler]:
+        if event.sym == tcod.event.K_ESCAPE:
+            return self.parent
+        elif event.sym in input_handlers.CURSOR_Y_KEYS and self.slots:
+            adjust = input_handlers.CURSOR_Y_KEYS[event.sym]
+            self.cursor = max(0, min(self.cursor + adjust, len(self.slots) - 1))
+        elif event.sym in (tcod.event.K_RETURN, tcod.event.K_KP_ENTER) and self.slots:
+            filename = self.slots[self.cursor].filename
+            pending_load = self.parent.pending_load
+            # The last game may already be loaded in the background.
+            if pending_load is None or pending_load.filename != filename:
+                pending_load = savefile.PendingLoad(filename)
+            return resume_game(self, pending_load)
+        return None
+
 class CharacterCreationMenu(input_handlers.BaseEventHandler):
     """A handler for the main menu, covering rendering and input."""
     def __init__(self,) -> None:
@@ -251,11 +357,16 @@ class CharacterCreationMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
         elif event.sym == tcod.event.K_c:
             try:
-                return input_handlers.MainGameEventHandler(new_game(
+                engine = new_game(
                     player_first_name=self.player_first_name,
                     player_last_name=self.player_first_name, 
                     player_age=self.player_age
-                    ))
+                    )
+                engine.save_filename = save_slots.new_slot()
+                # The first save pickles every entity, so it is done here, while the world
+                # is being generated anyway, rather than as a stall at the first autosave.
+                engine.save_as(engine.save_filename)
+                return input_handlers.MainGameEventHandler(engine)
             except Exception as exc:
                 traceback.print_exc()  # Print to stderr.
                 return input_handlers.PopupMessage(self, f"Error:\n{exc}")
@@ -0,0 +1,76 @@
+"""Snapshots of a fully built game, which can be restored many times over without generating it again."""
+from __future__ import annotations
+import copy
+import io
+import pickle
+from typing import Dict, TYPE_CHECKING
+import numpy as np  # type: ignore
+from pathfinding import FlowFields, PathHierarchy
+import rng
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+# The GameMap arrays which are copied on restore, rather than serialized with everything else.
+MAP_ARRAYS = ("tiles", "visible", "explored")
+
+
+def _copy_flow_fields(flow_fields: FlowFields) -> FlowFields:
+    """Copy flow fields, sharing the fields themselves since they are never modified in place."""
+    flow_fields = copy.copy(flow_fields)
+    flow_fields._fields = dict(flow_fields._fields)
+    return flow_fields
+
+
+class EngineSnapshot:
+    """
+    A frozen copy of an Engine, which restore() turns back into a new, independent Engine.
+
+    Each restore skips the config, procgen and pathfinding precomputation that
+    setup_game.new_game runs. The map's arrays are copied with a memcpy. The
+    flow fields and path hierarchy only depend on the map's layout, so every
+    restored Engine shares them. Everything else, the entities and their
+    components, is serialized once here and rebuilt in a single unpickle.
+    """
+
+    def __init__(self, engine: Engine):
+        game_map = engine.game_map
+        self._arrays: Dict[str, np.ndarray] = {
+            name: getattr(game_map, name).copy(order="F") for name in MAP_ARRAYS
+        }
+        self._flow_fields = _copy_flow_fields(game_map.flow_fields)
+        # PathHierarchy only replaces its graph when precomputed again, so it can be shared.
+        self._path_hierarchy = copy.copy(game_map.path_hierarchy)
+
+        shared = {id(getattr(game_map, name)): name for name in MAP_ARRAYS}
+        shared[id(game_map.flow_fields)] = "flow_fields"
+        shared[id(game_map.path_hierarchy)] = "path_hierarchy"
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: shared.get(id(obj))
+        pickler.dump(engine)
+        self._data = buffer.getvalue()
+
+    def restore(self) -> Engine:
+        """Return a new Engine in the state the snapshot was taken in.
+
+        Its random streams carry on from where they were too, so reseed them
+        with engine.rng.reseed() for each restored game to play out differently.
+        """
+        unpickler = pickle.Unpickler(io.BytesIO(self._data))
+        unpickler.persistent_load = self._load_shared
+        engine = unpickler.load()
+        game_map = engine.game_map
+        game_map.flow_fields.game_map = game_map
+        game_map.path_hierarchy.game_map = game_map
+        rng.activate(engine.rng)
+        return engine
+
+    def _load_shared(self, key: str) -> object:
+        if key in self._arrays:
+            return self._arrays[key].copy(order="F")
+        if key == "flow_fields":
+            return _copy_flow_fields(self._flow_fields)
+        if key == "path_hierarchy":
+            return copy.copy(self._path_hierarchy)
+        raise pickle.UnpicklingError(f"Unknown shared object {key!r}.")
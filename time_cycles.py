@@ -1,3 +1,7 @@
+import debug_log
+
+logger = debug_log.get_logger(debug_log.TIME)
+
 NIGHT_FOV_RANGE = 4
 class TimeCycle():
     def __init__(self, phase_ticks_dawn, phase_ticks_daytime, phase_ticks_dusk, phase_ticks_nighttime):
@@ -45,16 +49,16 @@ class TimeCycle():
         return self._phases.get(self.current_phase_name)
 
     def debug(self):
-        print(f"Debug Time Cycles")
-        print(self.current_phase_name)
+        logger.debug("Debug Time Cycles")
+        logger.debug("%s", self.current_phase_name)
         for key in self.__dict__.keys():
-            print(f"{key}: {self.__dict__.get(key)}")
+            logger.debug("%s: %s", key, self.__dict__.get(key))
     def set_remaining_phase_ticks(self, phase):
         """Set _remaing_phase_ticks to the total amount of ticks in a given phase"""
         if self._phases.get(phase) is not None:
             self._remaining_phase_ticks = self._phases.get(phase)
         else:
-            print(f"Unable to set phase transition ticks, phase {phase} does not exist")
+            logger.warning("Unable to set phase transition ticks, phase %s does not exist", phase)
             pass
     def tick(self):
         # Increment the daily and global tick amt